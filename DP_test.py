@@ -1,8 +1,17 @@
 #!/usr/bin/env python3
 
 from KP.algorithms.DP import *
+from KP.algorithms.solve import solve, MemoryBudgetExceeded
+from KP.algorithms.reduction import reduce
+from KP.algorithms.cache import DPCache
+from KP.algorithms.incremental import IncrementalDPWB
+from KP.algorithms.near import DPWB_near
+from KP.algorithms import instrument
 from KP.knapsack import generate
+import itertools
+import math
 import random
+import tempfile
 import unittest
 
 class TestDP(unittest.TestCase):
@@ -75,4 +84,380 @@ class TestDP(unittest.TestCase):
       # check if approximation ratio is met
       self.assertTrue(kpi.psumint(pbres_approx) >= ((1 - eps) * kpi.psumint(pbres_exact)))
 
+  def test_vectorized_vs_python_tables(self):
+    N = 15
+    for type in ["uncorr", "scorr", "ss"]:
+      kpi = generate(N, R = 20, type = type)
+      capacity = round(kpi.wsum() / 2)
+      vres = DPWB(kpi, capacity)
+      pres = DPWB(kpi, capacity, vectorized = False)
+      for i in range(N + 1):
+        self.assertEqual(list(vres.profits_table[i]), pres.profits_table[i])
+        self.assertEqual(list(vres.nsols_table[i]), pres.nsols_table[i])
+      self.assertEqual(vres.n_optima(), pres.n_optima())
+
+  def test_counts_do_not_overflow(self):
+    # all 2^70 packings are optimal
+    kpi = KnapsackInstance(capacity = 70, weights = [1] * 70, profits = [0] * 70)
+    self.assertEqual(DPWB(kpi).n_optima(), 2**70)
+
+  def test_count_only_mode(self):
+    N = 20
+    for type in ["uncorr", "wcorr", "ss"]:
+      kpi = generate(N, R = 30, type = type)
+      capacity = round(kpi.wsum() / 3)
+      full = DPWB(kpi, capacity)
+      rolling = DPWB(kpi, capacity, keep_tables = False)
+      self.assertIsNone(rolling.profits_table)
+      self.assertEqual(rolling.n_optima(), full.n_optima())
+      self.assertEqual(count_optima(kpi, capacity), (full.optimum(), full.n_optima()))
+      self.assertRaises(ValueError, rolling.optima_all)
+
+  def test_counts_for_several_capacities(self):
+    N = 20
+    kpi = generate(N, R = 30, type = "scorr")
+    capacities = [round(h / 12 * kpi.wsum()) for h in range(1, 12)]
+    multi = DPWB_multi(kpi, capacities)
+    for capacity, (profit, nsols) in zip(capacities, multi):
+      self.assertEqual(count_optima(kpi, capacity), (profit, nsols))
+
+  def test_linear_memory_reconstruction(self):
+    N = 25
+    for type in ["uncorr", "scorr", "invscorr"]:
+      kpi = generate(N, R = 100, type = type)
+      capacity = round(kpi.wsum() / 3)
+      result = DPWB(kpi, capacity, keep_tables = False)
+      sol = result.optima_single()
+      self.assertEqual(kpi.psumint(sol), result.optimum())
+      self.assertTrue(kpi.wsumint(sol) <= capacity)
+      self.assertEqual(len(sol), len(set(sol)))
+
+  def test_lazy_enumeration_of_optima(self):
+    N = 10
+    kpi = generate(N, R = 1, type = "uncorr")
+    result = DPWB(kpi, capacity = 3)
+    sols = list(result.iter_optima())
+    self.assertEqual(len(sols), 120)
+    self.assertEqual(len(set(map(frozenset, sols))), 120)
+    bitsets = list(result.iter_optima(bitset = True))
+    self.assertEqual(bitsets, [sum(1 << i for i in sol) for sol in sols])
+    first = list(itertools.islice(result.iter_optima(), 5))
+    self.assertEqual(first, sols[:5])
+
+  def test_uniform_sampling_of_optima(self):
+    N = 6
+    kpi = generate(N, R = 1, type = "uncorr")
+    result = DPWB(kpi, capacity = 3)
+    # 20 optima, each should be drawn about 100 times
+    samples = result.solutions_sample(2000, rng = random.Random(1))
+    counts = {}
+    for sol in samples:
+      self.assertEqual(kpi.wsumint(sol), 3)
+      counts[frozenset(sol)] = counts.get(frozenset(sol), 0) + 1
+    self.assertEqual(len(counts), 20)
+    self.assertTrue(all(50 <= c <= 150 for c in counts.values()))
+
+    X = result.solutions_sample(2000, rng = 1, batched = True)
+    self.assertEqual(X.shape, (2000, N))
+    self.assertTrue(all(X.sum(axis = 1) == 3))
+    self.assertEqual(len({row.tobytes() for row in X}), 20)
+
+    distinct = result.solutions_sample(8, replace = False)
+    self.assertEqual(len(set(map(frozenset, distinct))), 8)
+    distinct = result.solutions_sample(20, replace = False, batched = True)
+    self.assertEqual(len({row.tobytes() for row in distinct}), 20)
+
+  def test_counting_backends(self):
+    kpi = generate(80, R = 2, type = "ss")
+    capacity = round(kpi.wsum() / 2)
+    exact = DPWB(kpi, capacity, counts = "object").n_optima()
+    self.assertTrue(exact >= 2**63)
+    self.assertEqual(DPWB(kpi, capacity).n_optima(), exact)
+    self.assertEqual(DPWB(kpi, capacity, counts = "limbs", keep_tables = False).n_optima(), exact)
+    self.assertEqual(DPWB(kpi, capacity, counts = "mod", modulus = 10**9 + 7).n_optima(), exact % (10**9 + 7))
+    self.assertAlmostEqual(DPWB(kpi, capacity, counts = "log").n_optima(), math.log(exact))
+    self.assertRaises(OverflowError, DPWB, kpi, capacity, counts = "int64")
+    result = DPWB(kpi, capacity)
+    sol = result.solutions_sample(1)[0]
+    self.assertEqual(kpi.psumint(sol), result.optimum())
+    self.assertRaises(ValueError, DPWB(kpi, capacity, counts = "log").solutions_sample, 1)
+
+  def test_dp_profit_based_counting(self):
+    N = 12
+    for type in ["uncorr", "scorr", "ss", "usw"]:
+      kpi = generate(N, R = 10, type = type)
+      capacity = round(kpi.wsum() / 2)
+      wbres = DPWB(kpi, capacity)
+      pbres = DPPB(kpi, capacity)
+      self.assertEqual(pbres.optimum(), wbres.optimum())
+      self.assertEqual(pbres.n_optima(), wbres.n_optima())
+      sols = pbres.optima_all()
+      self.assertEqual(sorted(map(sorted, sols)), sorted(map(sorted, wbres.optima_all())))
+      for sol in pbres.solutions_sample(10):
+        self.assertEqual(kpi.psumint(sol), wbres.optimum())
+        self.assertTrue(kpi.wsumint(sol) <= capacity)
+
+  def test_dp_profit_based_optima_with_different_weights(self):
+    kpi = KnapsackInstance(capacity = 6, weights = [6, 3, 2, 4], profits = [6, 3, 3, 1])
+    result = DPPB(kpi)
+    self.assertEqual(result.n_optima(), 2)
+    self.assertEqual(sorted(map(sorted, result.optima_all())), [[0], [1, 2]])
+
+  def test_engine_selection(self):
+    kpi = generate(20, R = 100, type = "usw")
+    capacity = round(kpi.wsum() / 2)
+    result = solve(kpi, capacity)
+    self.assertEqual(result.engine, "DPPB")
+    self.assertEqual(result.value, DPWB(kpi, capacity, keep_tables = False).n_optima())
+
+    kpi = generate(20, R = 10, type = "uncorr")
+    capacity = round(kpi.wsum() / 2)
+    result = solve(kpi, capacity, want = "single")
+    self.assertEqual(result.engine, "DPWB")
+    self.assertEqual(kpi.psumint(result.value), result.solution.optimum())
+    self.assertRaises(MemoryBudgetExceeded, solve, kpi, capacity, want = "all", memory_budget = 100)
+
+  def test_dp_profit_based_bounded(self):
+    N = 25
+    for type in ["uncorr", "wcorr", "ss"]:
+      kpi = generate(N, R = 100, type = type)
+      capacity = round(kpi.wsum() / 3)
+      result = DPPB(kpi, capacity)
+      bounded = DPPB(kpi, capacity, bounded = True)
+      self.assertTrue(bounded.profit_limit <= result.profit_limit)
+      self.assertTrue(bounded.profit_limit >= result.optimum())
+      self.assertEqual(bounded.optimum(), result.optimum())
+      self.assertEqual(kpi.psumint(bounded.optima_single()), result.optimum())
+      self.assertEqual(bounded.n_optima(), result.n_optima())
+
+  def test_sparse_state_list_dp(self):
+    N = 25
+    for type in ["uncorr", "wcorr", "scorr", "ss"]:
+      kpi = generate(N, R = 20, type = type)
+      capacity = round(kpi.wsum() / 2)
+      wbres = DPWB(kpi, capacity, keep_tables = False)
+      nures = DPNU(kpi, capacity)
+      self.assertEqual(nures.optimum(), wbres.optimum())
+      self.assertEqual(nures.n_optima(), wbres.n_optima())
+      sol = nures.optima_single()
+      self.assertEqual(kpi.psumint(sol), wbres.optimum())
+      self.assertTrue(kpi.wsumint(sol) <= capacity)
+      self.assertEqual(len(nures.state_sizes()), N + 1)
+
+    kpi = KnapsackInstance(capacity = 6, weights = [6, 3, 2, 4], profits = [6, 3, 3, 1])
+    self.assertEqual(DPNU(kpi).n_optima(), 2)
+
+  def test_reduction_is_tie_safe(self):
+    N = 40
+    for type in ["uncorr", "wcorr", "scorr", "ss"]:
+      kpi = generate(N, R = 30, type = type)
+      capacity = round(kpi.wsum() / 3)
+      core, reduction = reduce(kpi, capacity)
+      self.assertEqual(core.N + len(reduction.fixed_in) + len(reduction.fixed_out), N)
+      full = DPWB(kpi, capacity)
+      reduced = DPWB(kpi, capacity, reduce = True)
+      self.assertEqual(reduced.optimum(), full.optimum())
+      self.assertEqual(reduced.n_optima(), full.n_optima())
+      sol = reduced.optima_single()
+      self.assertEqual(kpi.psumint(sol), full.optimum())
+      self.assertTrue(kpi.wsumint(sol) <= capacity)
+      if full.n_optima() <= 1000:
+        self.assertEqual(sorted(map(sorted, reduced.optima_all())), sorted(map(sorted, full.optima_all())))
+
+  def test_cache_of_dp_results(self):
+    with tempfile.TemporaryDirectory() as tmpdir:
+      cache = DPCache(tmpdir, tables = True)
+      kpi = generate(20, R = 30, type = "ss")
+      capacity = round(kpi.wsum() / 2)
+      full = DPWB(kpi, capacity)
+      for keep_tables in [False, True]:
+        cold = DPWB(kpi, capacity, keep_tables = keep_tables, cache = cache)
+        warm = DPWB(kpi, capacity, keep_tables = keep_tables, cache = cache)
+        self.assertEqual((cold.optimum(), cold.n_optima()), (full.optimum(), full.n_optima()))
+        self.assertEqual((warm.optimum(), warm.n_optima()), (full.optimum(), full.n_optima()))
+        self.assertEqual(warm.has_tables(), keep_tables)
+      self.assertEqual(sorted(map(sorted, warm.optima_all())), sorted(map(sorted, full.optima_all())))
+      self.assertEqual(count_optima(kpi, capacity, cache = cache), (full.optimum(), full.n_optima()))
+      self.assertEqual(DPWB(kpi, capacity, vectorized = False, cache = cache).n_optima(), full.n_optima())
+      self.assertEqual(DPWB(kpi, capacity, vectorized = False, cache = cache).n_optima(), full.n_optima())
+      # Python int counts beyond the int64 range survive a round trip
+      big = KnapsackInstance(capacity = 70, weights = [1] * 70, profits = [0] * 70)
+      DPWB(big, counts = "object", keep_tables = False, cache = cache)
+      self.assertEqual(DPWB(big, counts = "object", keep_tables = False, cache = cache).n_optima(), 2**70)
+
+      pb = DPPB(kpi, capacity, bounded = True, cache = cache)
+      pb = DPPB(kpi, capacity, bounded = True, cache = cache)
+      self.assertEqual((pb.optimum(), pb.n_optima()), (full.optimum(), full.n_optima()))
+
+      # a truncated entry is a miss and is recomputed
+      key = cache.key(kpi, capacity, "DPWB", counts = "auto", modulus = None)
+      path = cache._path(key)
+      with open(path, "rb") as f:
+        data = f.read()
+      with open(path, "wb") as f:
+        f.write(data[:len(data) // 2])
+      self.assertIsNone(cache.load(key))
+      self.assertEqual(count_optima(kpi, capacity, cache = cache), (full.optimum(), full.n_optima()))
+      self.assertEqual(DPWB(kpi, capacity, keep_tables = False, cache = cache).n_optima(), full.n_optima())
+
+      # runs with tables are not rewritten into a cache without tables
+      rows_only = DPCache(tmpdir)
+      stores = []
+      store = rows_only.store
+      rows_only.store = lambda *args, **kwargs: stores.append(args[0]) or store(*args, **kwargs)
+      for _ in range(3):
+        self.assertTrue(DPWB(kpi, capacity + 1, cache = rows_only).has_tables())
+      self.assertEqual(len(stores), 1)
+      self.assertEqual(rows_only._size, rows_only.size())
+
+      # least recently used entries are evicted first
+      cache.max_bytes = 0
+      cache.evict()
+      self.assertEqual(len(cache), 0)
+      self.assertIsNone(cache.get(kpi, capacity, "DPWB", counts = "auto", modulus = None))
+      # the running size total triggers the eviction
+      cache.max_bytes = 1
+      DPWB(kpi, capacity, keep_tables = False, cache = cache)
+      self.assertEqual((len(cache), cache._size), (0, 0))
+
+  def test_incremental_updates(self):
+    for type in ["uncorr", "ss"]:
+      kpi = generate(15, R = 10, type = type)
+      inc = IncrementalDPWB(kpi, capacity = round(kpi.wsum() / 3))
+      for step in range(40):
+        edit = step % 4
+        if edit == 0:
+          inc.add_item(random.randint(1, 10), random.randint(1, 10))
+        elif edit == 1:
+          inc.remove_item(random.randrange(inc.N))
+        elif edit == 2:
+          inc.extend_capacity(inc.capacity + random.randint(0, 10))
+        full = DPWB(inc.instance(), inc.capacity)
+        capacities = [0, inc.capacity // 2, inc.capacity]
+        self.assertEqual(inc.optima_for(capacities), full.optima_for(capacities))
+      self.assertEqual(inc.solution().n_optima(), full.n_optima())
+      sol = inc.optima_single()
+      self.assertEqual(inc.instance().psumint(sol), full.optimum())
+
+    kpi = KnapsackInstance(capacity = 40, weights = [1] * 70, profits = [0] * 70)
+    inc = IncrementalDPWB(kpi)
+    inc.extend_capacity(70)
+    self.assertEqual(inc.n_optima(), 2**70)
+    inc.remove_item(3)
+    self.assertEqual(inc.n_optima(), 2**69)
+
+  def test_instrumentation(self):
+    kpi = generate(12, R = 3, type = "uncorr")
+    capacity = round(kpi.wsum() / 2)
+    with instrument.recording() as sink:
+      result = DPWB(kpi, capacity)
+      DPWB(kpi, capacity, vectorized = False)
+      DPWB(kpi, capacity, keep_tables = False)
+      sols = result.optima_all()
+      result.optima_single()
+      DPPB(kpi, capacity).n_optima()
+    records = sink.records
+    self.assertEqual([(r["engine"], r["call"]) for r in records],
+      [("DPWB", "build")] * 3 + [("DPWB", "iter_optima"), ("DPWB", "optima_single"), ("DPPB", "build"), ("DPPB", "states")])
+    vectorized, python, rolling = records[:3]
+    self.assertEqual(vectorized["cells"], kpi.N * (capacity + 1))
+    self.assertEqual(vectorized["ties"], python["ties"])
+    self.assertEqual(rolling["ties"], python["ties"])
+    self.assertTrue(rolling["peak_bytes"] < vectorized["peak_bytes"])
+    self.assertEqual(records[3]["optima"], len(sols))
+    self.assertEqual(records[3]["branches"], len(sols) - 1)
+    self.assertTrue(records[3]["complete"])
+
+    # nothing is recorded once the sink is removed
+    self.assertFalse(instrument.enabled())
+    DPWB(kpi, capacity)
+    self.assertEqual(len(sink.records), 7)
+
+  def test_optima_into_solution_set(self):
+    kpi = generate(12, R = 3, type = "uncorr")
+    capacity = round(kpi.wsum() / 2)
+    for result in [DPWB(kpi, capacity), DPPB(kpi, capacity), DPWB(kpi, capacity, reduce = True)]:
+      solutions = result.optima_set()
+      self.assertEqual(len(solutions), result.n_optima())
+      self.assertEqual(sorted(solutions), sorted(map(sorted, result.optima_all())))
+      self.assertTrue(solutions.check(kpi, capacity, profit = result.optimum()).all())
+      self.assertEqual(len(result.optima_set(limit = 3)), min(3, result.n_optima()))
+
+  def test_nsols_table_beyond_int64(self):
+    kpi = KnapsackInstance(capacity = 70, weights = [1] * 70, profits = [0] * 70)
+    for counts in ["auto", "limbs"]:
+      result = DPWB(kpi, counts = counts)
+      self.assertEqual(result.nsols_table[70].shape, (71,))
+      self.assertEqual(result.nsols_table[70][70], 2**70)
+      self.assertEqual(result.nsols_table[3][2], 7)
+      self.assertEqual(result.n_optima(), 2**70)
+      self.assertEqual(len(result.solutions_sample(3)), 3)
+    self.assertEqual(IncrementalDPWB(kpi).solution().nsols_table[70][70], 2**70)
+
+  def test_batched_sampling_beyond_float64(self):
+    # 2^1100 optima, i.e. counts beyond the float64 range
+    kpi = KnapsackInstance(capacity = 1100, weights = [1] * 1100, profits = [0] * 1100)
+    X = DPWB(kpi).solutions_sample(200, rng = 1, batched = True)
+    self.assertEqual(X.shape, (200, 1100))
+    # every item is packed with probability 1/2
+    self.assertTrue(0.45 < X.mean() < 0.55)
+
+  def test_item_frequencies(self):
+    for type in ["uncorr", "scorr", "ss"]:
+      kpi = generate(14, R = 6, type = type)
+      capacity = round(kpi.wsum() / 2)
+      full = DPWB(kpi, capacity)
+      X = full.optima_set().to_matrix().astype(int)
+      for result in [full, DPWB(kpi, capacity, keep_tables = False), DPWB(kpi, capacity, vectorized = False)]:
+        self.assertEqual(result.item_frequencies().tolist(), X.sum(axis = 0).tolist())
+        self.assertEqual(result.item_frequencies(pairwise = True).tolist(), (X.T @ X).tolist())
+        self.assertEqual(result.item_frequencies(probabilities = True).tolist(), (X.sum(axis = 0) / len(X)).tolist())
+      reduced = DPWB(kpi, capacity, reduce = True)
+      for pairwise in [False, True]:
+        self.assertEqual(reduced.item_frequencies(pairwise = pairwise).tolist(), full.item_frequencies(pairwise = pairwise).tolist())
+      self.assertEqual(reduced.item_frequencies(probabilities = True).tolist(), full.item_frequencies(probabilities = True).tolist())
+      self.assertEqual(reduced.optima_for([capacity]), full.optima_for([capacity]))
+      self.assertRaises(ValueError, reduced.optima_for, [capacity - 1])
+
+    kpi = KnapsackInstance(capacity = 70, weights = [1] * 70, profits = [0] * 70)
+    self.assertEqual(DPWB(kpi, keep_tables = False).item_frequencies()[0], 2**69)
+    self.assertRaises(ValueError, DPWB(kpi, counts = "log").item_frequencies)
+
+  def test_near_optima(self):
+    for type in ["uncorr", "scorr", "ss"]:
+      kpi = generate(12, R = 8, type = type)
+      capacity = round(kpi.wsum() / 2)
+      items = list(kpi.getItems())
+      profits = {}
+      for packing in itertools.product([0, 1], repeat = kpi.N):
+        if sum(x * w for x, (w, _) in zip(packing, items)) <= capacity:
+          profit = sum(x * p for x, (_, p) in zip(packing, items))
+          profits[profit] = profits.get(profit, 0) + 1
+      optimum = max(profits)
+
+      full = DPWB_near(kpi, capacity, delta = None)
+      self.assertEqual(full.optimum(), optimum)
+      self.assertEqual([(p, c) for p, c in full.histogram() if c > 0], sorted(profits.items(), reverse = True))
+      self.assertEqual(full.n_near_optima(), sum(profits.values()))
+
+      for delta in [0, 1, 5]:
+        result = DPWB_near(kpi, capacity, delta = delta, keep_tables = True)
+        expected = sum(c for p, c in profits.items() if p >= optimum - delta)
+        self.assertEqual(result.n_near_optima(), expected)
+        self.assertEqual(full.n_near_optima(delta), expected)
+        self.assertEqual(result.band_row.shape, (capacity + 1, delta + 1))
+        samples = result.solutions_sample(min(expected, 20), replace = False, rng = random.Random(1))
+        self.assertEqual(len(set(map(tuple, samples))), len(samples))
+        for packing in samples:
+          self.assertTrue(kpi.wsumint(packing) <= capacity)
+          self.assertTrue(kpi.psumint(packing) >= optimum - delta)
+      self.assertEqual(DPWB_near(kpi, capacity).n_optima(), DPWB(kpi, capacity).n_optima())
+
+    # counts beyond int64
+    kpi = KnapsackInstance(capacity = 70, weights = [1] * 70, profits = [1] * 69 + [0])
+    self.assertEqual(DPWB_near(kpi, delta = 1).histogram(), [(69, 2), (68, 2 * 69)])
+    kpi = KnapsackInstance(capacity = 70, weights = [1] * 70, profits = [0] * 70)
+    self.assertEqual(DPWB_near(kpi).n_optima(), 2**70)
+    self.assertRaises(ValueError, DPWB_near(kpi).solutions_sample, 1)
+
 unittest.main()
@@ -1,6 +1,14 @@
 from KP.knapsack import KnapsackInstance
-import queue
-import math
+import itertools
+import random
+import numpy as np # pip install numpy
+from KP.algorithms.counting import make_counter, from_limbs, COUNT_LIMIT
+from KP.algorithms.reduction import reduce as reduce_instance, ReducedSolution
+from KP.algorithms import instrument
+from KP.solutions import SolutionSet
+
+# Largest number of rows optima_set() allocates up front
+RESERVE_LIMIT = 2**24
 
 class DPWBSolution:
   '''
@@ -12,90 +20,562 @@ class DPWBSolution:
     profits_table: table m(i, j) which is the maximum profit reachable
     with items {1,...,i} and maximum weight j.
     nsols_table: entry c(i, j) indicates the number of solutions with maximum profit m(i,j) which can be reached by items {1,...,i} and maximum wieight j.
+    Rows are 1-D; counts beyond the int64 range are Python ints in object rows.
+    profits_row: last row m(N, .) of the profits table. Only needed if the tables
+    were not kept.
+    nsols_row: last row c(N, .) of the nsols table. Only needed if the tables
+    were not kept.
+    counter (Counter): Counting backend the nsols table was built with. Defaults to
+    plain integer counts.
   Returns:
     Object of type DPWBSolution
   '''
-  def __init__(self, kpi, capacity, profits_table, nsols_table):
+  def __init__(self, kpi, capacity, profits_table, nsols_table, profits_row=None, nsols_row=None, counter=None):
     self.kpi = kpi
     self.profits_table = profits_table
     self.nsols_table = nsols_table
     self.N = kpi.N
     self.capacity = capacity
+    if profits_row is None:
+      profits_row = profits_table[self.N]
+    if nsols_row is None:
+      nsols_row = nsols_table[self.N]
+    self.profits_row = profits_row
+    self.nsols_row = nsols_row
+    if counter is None:
+      counter = make_counter("object")
+    self.counter = counter
+
+  def has_tables(self):
+    return self.profits_table is not None
+
+  def _require_tables(self):
+    if not self.has_tables():
+      raise ValueError("This method needs the full tables; run DPWB with keep_tables=True.")
+
+  def optimum(self):
+    return int(self.profits_row[self.capacity])
 
   def n_optima(self):
-    return self.nsols_table[self.N][self.capacity]
+    return self.counter.value(self.nsols_row, self.capacity)
+
+  def optima_for(self, capacities):
+    '''
+    Optimal profit and number of global optima for smaller capacities
+
+    The last table row holds m(N, c) and c(N, c) for every c <= capacity,
+    i.e. no additional DP run is needed.
+
+    Args:
+      capacities (list): List of capacities, each at most the capacity of the solution.
+    Returns:
+      List of (optimal profit, number of global optima) tuples.
+    '''
+    assert all(0 <= c <= self.capacity for c in capacities)
+    return [(int(self.profits_row[c]), self.counter.value(self.nsols_row, c)) for c in capacities]
+
+  def optima_single(self, method=None):
+    '''
+    Reconstruct a single global optimum
+
+    Args:
+      method (str): Either "table" (traceback in the profits table) or "hirschberg"
+      (divide-and-conquer recomputation in O(capacity) memory, see _hirschberg).
+      Defaults to "table" if the tables were kept and "hirschberg" otherwise.
+    Returns:
+      List of packed items (in decreasing order).
+    '''
+    if method is None:
+      method = "table" if self.has_tables() else "hirschberg"
+    assert method in ["table", "hirschberg"]
+    record = instrument.start("DPWB", "optima_single", N=self.N, capacity=self.capacity, method=method)
+
+    if method == "hirschberg":
+      items = [(int(weight), int(profit)) for weight, profit in self.kpi.getItems()]
+      reconstruction = []
+      _hirschberg(items, 0, self.N, self.capacity, reconstruction)
+      instrument.finish(record)
+      return sorted(reconstruction, reverse=True)
 
-  def optima_single(self):
     # We want just a single global optimum
+    self._require_tables()
     reconstruction = []
     i = self.kpi.N
     j = self.capacity
     items = list(self.kpi.getItems())
+    # cells on the path where packing and not packing are both optimal
+    branches = 0
 
     while i > 0:
       # traceback in the table starting from tbl[N, capacity]
       if self.profits_table[i][j] != self.profits_table[i - 1][j]:
         reconstruction.append(i - 1)
         j -= items[i - 1][0]
+      elif record is not None and j >= items[i - 1][0] and self.profits_table[i][j] == self.profits_table[i - 1][j - items[i - 1][0]] + items[i - 1][1]:
+        branches += 1
       i -= 1
 
+    instrument.finish(record, branches=branches)
     return reconstruction
 
   def optima_all(self):
     # We want ALL global optima
-    reconstruction = []
-    i = self.kpi.N
-    j = self.capacity
+    return list(self.iter_optima())
+
+  def optima_set(self, limit=None):
+    '''
+    All global optima as a SolutionSet (see KP.solutions)
+
+    The enumeration writes into the packed bitset array directly, i.e. no
+    list of packings is built.
+
+    Args:
+      limit (int): Stop after this many optima. Defaults to all.
+    Returns:
+      SolutionSet
+    '''
+    return _optima_set(self, limit)
+
+  def iter_optima(self, bitset=False):
+    '''
+    Lazily enumerate all global optima
+
+    Depth-first traceback in the profits table. All packings share a single
+    prefix list which is cut back to the last branching point after a packing
+    has been yielded, i.e. apart from the tables only O(N) memory is alive.
+    Use itertools.islice to stop early.
+
+    Args:
+      bitset (bool): Yield packings as int bitsets (bit i set iff item i is packed)
+      instead of lists of packed items. Defaults to False.
+    Returns:
+      Generator of packings.
+    '''
+    self._require_tables()
+    tbl = self.profits_table
     items = list(self.kpi.getItems())
 
-    count = 0
-    # we store partially reconstructed packing plans in a queue
-    Q = queue.Queue()
-    Q.put((self.kpi.N, self.capacity, []))
-    while not Q.empty():
-      i, j, packing = Q.get()
-      # classic reconstruction starts
-      while i > 0:
-        if self.profits_table[i][j] != self.profits_table[i - 1][j]:
-          # item was packed, i.e. self.profits_table[i-1][j] < self.profits_table[i, j]
-          packing.append(i - 1)
-          j -= items[i - 1][0]
-        elif (j - items[i - 1][0] >= 0) and (self.profits_table[i][j] == (self.profits_table[i - 1][j - items[i-1][0]] + items[i-1][1])):
-          # not packing item results in the same profit as with items {0, ...,  n-2}?
-          partialPacking = packing[:]  # make copy
-          partialPacking.append(i - 1)
-          Q.put((i - 1, j - items[i - 1][0], partialPacking))
+    # shared prefix of the current packing (in decreasing order) and its bitset
+    packing = []
+    bits = 0
+    # branching points (i, j, len(packing), bits) where packing item i-1 is left to do
+    branches = []
+    i = self.N
+    j = self.capacity
+    record = instrument.start("DPWB", "iter_optima", N=self.N, capacity=self.capacity)
+    n_branches = 0
+    n_optima = 0
+
+    try:
+      while True:
+        # classic reconstruction starts
+        while i > 0:
+          weight, profit = items[i - 1]
+          if tbl[i][j] != tbl[i - 1][j]:
+            # item was packed, i.e. tbl[i-1][j] < tbl[i, j]
+            packing.append(i - 1)
+            bits |= 1 << (i - 1)
+            j -= weight
+          elif (j - weight >= 0) and (tbl[i][j] == (tbl[i - 1][j - weight] + profit)):
+            # packing the item results in the same profit, i.e. revisit later
+            branches.append((i, j, len(packing), bits))
+            n_branches += 1
+          i -= 1
+
+        n_optima += 1
+        yield bits if bitset else packing[:]
+
+        if not branches:
+          return
+
+        # backtrack to the last branching point and pack the item this time
+        i, j, depth, bits = branches.pop()
+        del packing[depth:]
+        packing.append(i - 1)
+        bits |= 1 << (i - 1)
+        j -= items[i - 1][0]
         i -= 1
-      count += 1
-      reconstruction.append(packing)
-
-    return reconstruction
+    finally:
+      # also reached if the generator is closed early
+      instrument.finish(record, branches=n_branches, optima=n_optima, complete=not branches)
+
+  def _sample_single(self, rng):
+    # walk from tbl[N, capacity] to the top and pack item i-1 with probability
+    # proportional to the number of optima of the remaining items
+    tbl = self.profits_table
+    nsols = self.nsols_table
+    value = self.counter.value
+    items = list(self.kpi.getItems())
 
-  def solutions_sample(self, k, replace=True):
+    packing = []
+    j = self.capacity
+    for i in range(self.N, 0, -1):
+      weight, profit = items[i - 1]
+      nsolsA = value(nsols[i - 1], j) if tbl[i - 1][j] == tbl[i][j] else 0
+      nsolsB = 0
+      if j - weight >= 0 and tbl[i - 1][j - weight] + profit == tbl[i][j]:
+        nsolsB = value(nsols[i - 1], j - weight)
+      if rng.randrange(nsolsA + nsolsB) < nsolsB:
+        packing.append(i - 1)
+        j -= weight
+    return packing
+
+  def _sample_batch(self, k, rng):
+    # all k walks at once; each row is handled with whole-array operations
+    items = list(self.kpi.getItems())
+    X = np.zeros((k, self.N), dtype=np.uint8)
+    j = np.full(k, self.capacity, dtype=np.int64)
+
+    for i in range(self.N, 0, -1):
+      weight, profit = items[i - 1]
+      tbl = np.asarray(self.profits_table[i])
+      prev_tbl = np.asarray(self.profits_table[i - 1])
+      prev_nsols = self.nsols_table[i - 1]
+
+      fits = j >= weight
+      jB = np.where(fits, j - weight, 0)
+      # counts as mantissa * 2^exponent; both are scaled by the larger power of
+      # two, i.e. the ratio is exact up to float precision for any count
+      mantissaA, exponentA = self.counter.scaled(prev_nsols, j)
+      mantissaB, exponentB = self.counter.scaled(prev_nsols, jB)
+      exponent = np.maximum(exponentA, exponentB)
+      nsolsA = np.where(prev_tbl[j] == tbl[j], np.ldexp(mantissaA, exponentA - exponent), 0)
+      nsolsB = np.where(fits & (prev_tbl[jB] + profit == tbl[j]), np.ldexp(mantissaB, exponentB - exponent), 0)
+      prob = nsolsB / (nsolsA + nsolsB)
+
+      pack = rng.random(k) < prob
+      X[pack, i - 1] = 1
+      j[pack] -= weight
+    return X
+
+  def solutions_sample(self, k, replace=True, rng=None, batched=False):
+    '''
+    Sample global optima uniformly at random
+
+    Each sample is a single walk through the tables: starting in tbl[N, capacity]
+    item i-1 is packed with probability proportional to the number of optima of
+    items {1, ..., i-1} that are left if it is packed, i.e. sampling costs O(N)
+    and no optima are enumerated.
+
+    Args:
+      k (int): Number of samples.
+      replace (bool): Sample with replacement? If False, duplicates are rejected.
+      rng: Source of randomness. Module random or a random.Random object if
+      batched is False (defaults to module random), otherwise anything accepted
+      by numpy.random.default_rng.
+      batched (bool): Draw all samples at once with NumPy? The sampling
+      probabilities are then rounded to float precision. Defaults to False.
+    Returns:
+      List of k packings (lists of packed items in decreasing order) if batched is
+      False and a k x N 0/1 matrix otherwise.
+    '''
     assert 1 <= k
-    pass
+    self._require_tables()
+    if not self.counter.exact:
+      raise ValueError("Sampling needs exact counts; run DPWB with an exact counting backend.")
+    n_optima = self.n_optima()
+    assert replace or k <= n_optima
+
+    if batched:
+      rng = np.random.default_rng(rng)
+      if replace:
+        return self._sample_batch(k, rng)
+      # rejection of duplicate rows
+      X = np.zeros((0, self.N), dtype=np.uint8)
+      seen = set()
+      while len(X) < k:
+        Y = self._sample_batch(k - len(X), rng)
+        keep = []
+        for r, row in enumerate(np.packbits(Y, axis=1)):
+          key = row.tobytes()
+          if key not in seen:
+            seen.add(key)
+            keep.append(r)
+        X = np.concatenate([X, Y[keep]])
+      return X
+
+    if rng is None:
+      rng = random
+    return _sample_optima(self, k, replace, n_optima, rng)
+
+  def item_frequencies(self, pairwise=False, probabilities=False):
+    '''
+    Number of global optima each item (or pair of items) is part of
+
+    No optima are enumerated. The optima containing item i are split into
+    the packed items before i, item i and the items after i. The former are
+    counted by the forward row m(i, .), the latter by a backward row of the
+    best packings of the items after i with weight exactly w, i.e. all items
+    cost O(N * capacity) after a backward pass of the same cost. The pairwise
+    counts repeat the forward pass with item i packed for each i, i.e. they
+    cost O(N^2 * capacity). Both need O(N * capacity) memory for the rows.
+
+    Args:
+      pairwise (bool): Return the N x N matrix of co-occurrence counts (the
+      diagonal holds the counts of the items) instead of the counts of the items.
+      probabilities (bool): Divide by the number of optima, i.e. return the
+      fraction of optima that contain an item (or pair). Defaults to False.
+    Returns:
+      numpy.ndarray of Python ints (float64 if probabilities is True) of length
+      N or shape (N, N).
+    '''
+    if not self.counter.exact:
+      raise ValueError("Item frequencies need exact counts; run DPWB with an exact counting backend.")
+    items = [(int(weight), int(profit)) for weight, profit in self.kpi.getItems()]
+    kernel = _WBKernel(self.capacity, self.counter)
+    optimum = self.optimum()
+
+    # forward rows (kept or recomputed) and backward rows of exact weights
+    if self.has_tables():
+      forward = [(np.asarray(self.profits_table[i]), _nsols_array(self.nsols_table[i])) for i in range(self.N + 1)]
+    else:
+      forward = [kernel.first_row()]
+      for weight, profit in items:
+        forward.append(kernel.row(*forward[-1], weight, profit))
+    backward = [_exact_first_row(self.capacity, self.counter)]
+    for weight, profit in reversed(items):
+      backward.append(kernel.row(*backward[-1], weight, profit))
+    backward.reverse()
+
+    counts = np.zeros((self.N, self.N) if pairwise else self.N, dtype=object)
+    for i, (weight, profit) in enumerate(items):
+      count = _count_combined(forward[i], backward[i + 1], weight, profit, self.capacity, optimum)
+      if not pairwise:
+        counts[i] = count
+        continue
+      counts[i, i] = count
+      # forward rows of items {1,...,j} with item i packed
+      row = _packed_row(forward[i], weight, profit)
+      for j in range(i + 1, self.N):
+        counts[i, j] = counts[j, i] = _count_combined(row, backward[j + 1], items[j][0], items[j][1], self.capacity, optimum)
+        row = kernel.row(*row, items[j][0], items[j][1])
+
+    if probabilities:
+      return (counts / self.n_optima()).astype(np.float64)
+    return counts
+
+
+class _WBKernel:
+  '''
+  Vectorized computation of the weight-based tables row by row.
 
+  Row i is computed from row i-1 with whole-array operations over the
+  capacity axis. The tie/greater/less semantics are the same as in the
+  cell-wise loop of DPWB. Scratch buffers are allocated once and reused
+  for all rows.
 
-def DPWB(kpi, capacity=None):#, multiGlobal=True, countOnly=False):
+  Args:
+    capacity (int): Knapsack capacity, i.e. rows have length capacity + 1.
+    counter (Counter): Counting backend, see KP.algorithms.counting.
   '''
-  Dynamic Programming algorithm for the 0-1 Knapsack Problem (KP)
+  def __init__(self, capacity, counter):
+    self.capacity = capacity
+    self.counter = counter
+    self.optionB = np.empty(capacity + 1, dtype=np.int64)
+    self.ge = np.empty(capacity + 1, dtype=bool)
+    self.le = np.empty(capacity + 1, dtype=bool)
+    # number of ties (packOptionA == packOptionB); only counted if not None
+    self.ties = None
+
+  def first_row(self):
+    return np.zeros(self.capacity + 1, dtype=np.int64), self.counter.ones(self.capacity + 1)
+
+  def row(self, prev_tbl, prev_nsols, weight, profit, tbl=None, nsols=None):
+    '''
+    Args:
+      prev_tbl (numpy.ndarray): Row i-1 of the profits table.
+      prev_nsols (numpy.ndarray): Row i-1 of the nsols table.
+      weight (int): Weight of item i.
+      profit (int): Profit of item i.
+      tbl (numpy.ndarray): Optional output buffer for row i of the profits table.
+      nsols (numpy.ndarray): Optional output buffer for row i of the nsols table.
+      It is ignored if it does not match the representation of the counts of row i-1.
+    Returns:
+      Tuple (tbl, nsols) of row i.
+    '''
+    prev_nsols = self.counter.prepare(prev_nsols)
+
+    if tbl is None:
+      tbl = np.empty(self.capacity + 1, dtype=np.int64)
+    if nsols is None or nsols.dtype != prev_nsols.dtype or nsols.shape != prev_nsols.shape:
+      nsols = self.counter.empty_like(prev_nsols)
+
+    size = self.capacity + 1 - weight
+    if size <= 0:
+      # item does not fit in for any capacity
+      tbl[:] = prev_tbl
+      nsols[...] = prev_nsols
+      return tbl, nsols
+
+    tbl[:weight] = prev_tbl[:weight]
+    nsols[..., :weight] = prev_nsols[..., :weight]
+
+    packOptionA = prev_tbl[weight:]
+    packOptionB = np.add(prev_tbl[:size], profit, out=self.optionB[:size])
+    np.maximum(packOptionA, packOptionB, out=tbl[weight:])
+
+    # ties (A == B) add up the counts of both options
+    ge = np.greater_equal(packOptionA, packOptionB, out=self.ge[:size])
+    le = np.less_equal(packOptionA, packOptionB, out=self.le[:size])
+    if self.ties is not None:
+      self.ties += int(np.count_nonzero(ge & le))
+    self.counter.combine(prev_nsols[..., weight:], prev_nsols[..., :size], ge, le, out=nsols[..., weight:])
+
+    return tbl, nsols
+
+
+def _dpwb_tables(items, capacity, counter, record=None):
+  # vectorized engine: one row per item
+  kernel = _WBKernel(capacity, counter)
+  if record is not None:
+    kernel.ties = 0
+  tbl = np.empty((len(items) + 1, capacity + 1), dtype=np.int64)
+  tbl[0], row = kernel.first_row()
+  nsols = [row]
+
+  for i, (weight, profit) in enumerate(items):
+    i += 1
+    _, row = kernel.row(tbl[i - 1], nsols[i - 1], weight, profit, tbl=tbl[i])
+    nsols.append(row)
+
+  if record is not None:
+    record.update(ties=kernel.ties, peak_bytes=instrument.nbytes(tbl, nsols, kernel.optionB, kernel.ge, kernel.le))
+  # kept rows are 1-D, i.e. nsols[i][j] is c(i, j); multi-word counts become Python ints
+  return tbl, [from_limbs(row) for row in nsols]
+
+
+def _dpwb_last_row(items, capacity, counter, record=None):
+  # vectorized engine keeping only the previous and the current row
+  kernel = _WBKernel(capacity, counter)
+  if record is not None:
+    kernel.ties = 0
+  tbl, nsols = kernel.first_row()
+  spare_tbl, spare_nsols = np.empty_like(tbl), np.empty_like(nsols)
+
+  for weight, profit in items:
+    new_tbl, new_nsols = kernel.row(tbl, nsols, weight, profit, tbl=spare_tbl, nsols=spare_nsols)
+    spare_tbl, spare_nsols = tbl, nsols
+    tbl, nsols = new_tbl, new_nsols
+
+  if record is not None:
+    record.update(ties=kernel.ties, peak_bytes=instrument.nbytes(tbl, nsols, spare_tbl, spare_nsols, kernel.optionB, kernel.ge, kernel.le))
+  return tbl, nsols
+
+
+def _dpwb_profits_row(items, capacity):
+  # last row of the profits table only
+  tbl = np.zeros(capacity + 1, dtype=np.int64)
+  for weight, profit in items:
+    if weight <= capacity:
+      np.maximum(tbl[weight:], tbl[:capacity + 1 - weight] + profit, out=tbl[weight:])
+  return tbl
+
+
+# Profit of cells without a packing of exactly that weight in the rows of
+# exact weights; sums with real profits stay far below zero.
+UNREACHABLE = -2**62
+
+
+def _exact_first_row(capacity, counter):
+  # row of no items with exact weights: only weight 0 is reachable. The kernel
+  # turns it into the best packings of exactly weight j (ties and counts alike).
+  tbl = np.full(capacity + 1, UNREACHABLE, dtype=np.int64)
+  tbl[:1] = 0
+  nsols = counter.ones(capacity + 1)
+  nsols[..., 1:] = 0
+  return tbl, nsols
+
+
+def _packed_row(row, weight, profit):
+  # row of packings of the same items with one more item packed for sure
+  tbl, nsols = row
+  size = max(len(tbl) - weight, 0)
+  packed_tbl = np.full(len(tbl), UNREACHABLE, dtype=np.int64)
+  packed_tbl[weight:] = tbl[:size] + profit
+  packed_nsols = np.zeros_like(nsols)
+  packed_nsols[..., weight:] = nsols[..., :size]
+  return packed_tbl, packed_nsols
+
+
+def _counts_at(nsols, idx):
+  # counts of a row at the given columns (Python ints for multi-word counts)
+  if nsols.ndim == 2:
+    return sum(nsols[k, idx].astype(object) << (32 * k) for k in range(nsols.shape[0]))
+  return nsols[idx]
+
+
+def _count_combined(front, back, weight, profit, capacity, optimum):
+  '''
+  Number of optimal packings made of a front part, one item and a back part
 
   Args:
-    kpi (KnapsackInstance): Object of class KP.KnapsackInstance.KnapsackInstance
-    capacity (int)        : Knapsack capacity, i.e. maximum weight of packed items. Defaults
-    to the capacity of KI if None.
+    front (tuple): Row (profits, nsols) of the front items; m(., c) is the best
+    profit with weight at most c.
+    back (tuple): Row (profits, nsols) of the back items with exact weights.
+    weight (int): Weight of the item in between.
+    profit (int): Profit of the item in between.
+    capacity (int): Knapsack capacity.
+    optimum (int): Optimal profit.
   Returns:
-    An object of class DPSolution
+    Number of packings (int). Only back parts that are the best of their weight
+    can be completed to an optimum; each is completed by all best front parts.
   '''
-  if capacity is None:
-    capacity = kpi.capacity
+  c = capacity - weight
+  if c < 0:
+    return 0
+  # front gets c - w, back exactly w
+  values = front[0][c::-1] + back[0][:c + 1] + profit
+  idx = np.flatnonzero(values == optimum)
+  if len(idx) == 0:
+    return 0
+  a, b = _counts_at(front[1], c - idx), _counts_at(back[1], idx)
+  if a.dtype == np.int64 and b.dtype == np.int64 and int(a.max()) * int(b.max()) * len(idx) < COUNT_LIMIT:
+    return int(np.dot(a, b))
+  return int(np.dot(a.astype(object), b.astype(object)))
+
+
+def _hirschberg(items, lo, hi, capacity, packing):
+  '''
+  Divide-and-conquer reconstruction of a single optimal packing
 
-  # (w_i, p_i)
-  items = list(kpi.getItems())
+  The items lo, ..., hi-1 are split in two halves. The last profits row of
+  both halves is computed and the capacity is split such that the sum of
+  both halves is maximal. Both halves are then solved recursively with
+  their share of the capacity. Only O(capacity) memory is needed at a
+  time and, since the capacities of the subproblems on each level sum up
+  to at most capacity, the total work is about twice the work of DPWB.
 
-  # init table
-  tbl = [[0] * (capacity + 1) for _ in range(kpi.N + 1)]
-  nsols = [[1] * (capacity + 1) for _ in range(kpi.N + 1)]
+  Args:
+    items (list): List of (w_i, p_i) tuples.
+    lo (int): Index of the first item.
+    hi (int): Index after the last item.
+    capacity (int): Capacity available to items lo, ..., hi-1.
+    packing (list): List the packed items are appended to.
+  '''
+  if hi <= lo:
+    return
+  if hi - lo == 1:
+    weight, profit = items[lo]
+    if weight <= capacity and profit > 0:
+      packing.append(lo)
+    return
+
+  mid = (lo + hi) // 2
+  front = _dpwb_profits_row(items[lo:mid], capacity)
+  back = _dpwb_profits_row(items[mid:hi], capacity)
+  # front[c] + back[capacity - c] for c = 0, ..., capacity
+  split = int(np.argmax(front + back[::-1]))
+  del front, back
+
+  _hirschberg(items, lo, mid, split, packing)
+  _hirschberg(items, mid, hi, capacity - split, packing)
+
+
+def _dpwb_tables_python(items, capacity, record=None):
+  # reference engine: one Python iteration per cell
+  tbl = [[0] * (capacity + 1) for _ in range(len(items) + 1)]
+  nsols = [[1] * (capacity + 1) for _ in range(len(items) + 1)]
+  ties = 0
 
   for i, (weight, profit) in enumerate(items):
     i += 1
@@ -112,6 +592,7 @@ def DPWB(kpi, capacity=None):#, multiGlobal=True, countOnly=False):
         if (packOptionA == packOptionB):
           tbl[i][cap] = packOptionA
           nsols[i][cap] = nsols[i - 1][cap] + nsols[i - 1][cap - weight]
+          ties += 1
         elif (packOptionA > packOptionB):
           tbl[i][cap] = packOptionA
           nsols[i][cap] = nsols[i - 1][cap]
@@ -119,51 +600,477 @@ def DPWB(kpi, capacity=None):#, multiGlobal=True, countOnly=False):
           tbl[i][cap] = packOptionB
           nsols[i][cap] = nsols[i - 1][cap - weight]
 
-  return DPWBSolution(kpi=kpi, capacity=capacity, profits_table=tbl, nsols_table=nsols)
+  if record is not None:
+    # Python lists; their memory is not measured
+    record.update(ties=ties, peak_bytes=None)
+  return tbl, nsols
+
+
+def DPWB(kpi, capacity=None, vectorized=True, keep_tables=True, counts="auto", modulus=None, reduce=False, cache=None):
+  '''
+  Dynamic Programming algorithm for the 0-1 Knapsack Problem (KP)
+
+  Args:
+    kpi (KnapsackInstance): Object of class KP.KnapsackInstance.KnapsackInstance
+    capacity (int)        : Knapsack capacity, i.e. maximum weight of packed items. Defaults
+    to the capacity of KI if None.
+    vectorized (bool)     : Compute each item row with NumPy whole-array operations?
+    If False, the table is filled cell by cell in pure Python. Defaults to True.
+    keep_tables (bool)    : Keep the full (N+1)x(capacity+1) tables? If False, only
+    the previous and the current row are kept, i.e. memory is O(capacity). The
+    solution then supports counting and optima_single() via divide-and-conquer
+    recomputation, but no enumeration of all optima. Defaults to True.
+    counts (str)          : Counting backend of the vectorized engine (see
+    KP.algorithms.counting.make_counter). The default "auto" uses int64 counts as long
+    as they cannot overflow and exact multi-word counts afterwards. With "mod"
+    and "log", n_optima() returns the count modulo modulus or its natural logarithm.
+    modulus (int)         : Modulus for counts="mod".
+    reduce (bool)         : Fix items first (see KP.algorithms.reduction.reduce) and run
+    the DP on the remaining core only? Counts, optima and packings are mapped back
+    to the instance. Defaults to False.
+    cache (DPCache)       : Cache of DP results (see KP.algorithms.cache). On a hit the
+    solution is rebuilt from the stored rows (or tables) without running the DP;
+    otherwise the result is stored. Defaults to None, i.e. no caching.
+  Returns:
+    An object of class DPSolution (or ReducedSolution if reduce is True)
+  '''
+  if capacity is None:
+    capacity = kpi.capacity
+  assert vectorized or (keep_tables and counts in ["auto", "object"])
+
+  if reduce:
+    core, reduction = reduce_instance(kpi, capacity)
+    solution = DPWB(core, reduction.capacity, vectorized=vectorized, keep_tables=keep_tables, counts=counts, modulus=modulus, cache=cache)
+    return ReducedSolution(kpi, capacity, solution, reduction)
+
+  if cache is not None:
+    # the pure Python engine has Python int counts
+    key = cache.key(kpi, capacity, "DPWB", counts=counts if vectorized else "object", modulus=modulus)
+    solution = _dpwb_cached(kpi, capacity, cache, key, keep_tables, modulus)
+    if solution is None:
+      solution = DPWB(kpi, capacity, vectorized=vectorized, keep_tables=keep_tables, counts=counts, modulus=modulus)
+      # a miss of keep_tables=True on an entry with the last rows only is
+      # rewritten only if the cache adds the tables
+      if cache.tables or key not in cache:
+        _dpwb_store(solution, cache, key)
+    return solution
+
+  counter = make_counter(counts, modulus)
+
+  # (w_i, p_i)
+  items = [(int(weight), int(profit)) for weight, profit in kpi.getItems()]
+
+  record = instrument.start("DPWB", "build", N=kpi.N, capacity=capacity, keep_tables=keep_tables, vectorized=vectorized, counts=counts)
+
+  if not keep_tables:
+    tbl, nsols = _dpwb_last_row(items, capacity, counter, record)
+    instrument.finish(record, cells=kpi.N * (capacity + 1))
+    return DPWBSolution(kpi=kpi, capacity=capacity, profits_table=None, nsols_table=None, profits_row=tbl, nsols_row=nsols, counter=counter)
+
+  if vectorized:
+    tbl, nsols = _dpwb_tables(items, capacity, counter, record)
+  else:
+    # Python ints never overflow
+    tbl, nsols = _dpwb_tables_python(items, capacity, record)
+    counter = make_counter("object")
+
+  instrument.finish(record, cells=kpi.N * (capacity + 1))
+  return DPWBSolution(kpi=kpi, capacity=capacity, profits_table=tbl, nsols_table=nsols, counter=counter)
+
+
+def _nsols_array(row):
+  # rows of the pure Python engine are lists of Python ints
+  if isinstance(row, np.ndarray):
+    return row
+  return np.array(row, dtype=object)
+
+
+def _dpwb_cached(kpi, capacity, cache, key, keep_tables, modulus):
+  # solution rebuilt from a cache entry or None on a miss
+  entry = cache.load(key)
+  if entry is None or (keep_tables and "profits_table" not in entry):
+    return None
+  counter = make_counter(entry["counter"], modulus)
+  if keep_tables:
+    nsols = [entry["nsols_table_{}".format(i)] for i in range(kpi.N + 1)]
+    return DPWBSolution(kpi=kpi, capacity=capacity, profits_table=entry["profits_table"], nsols_table=nsols, counter=counter)
+  return DPWBSolution(kpi=kpi, capacity=capacity, profits_table=None, nsols_table=None,
+    profits_row=entry["profits_row"], nsols_row=entry["nsols_row"], counter=counter)
+
+
+def _dpwb_store(solution, cache, key):
+  # the last rows are always stored, the tables only if the cache asks for them
+  arrays = {
+    "counter": np.array(solution.counter.name),
+    "profits_row": np.asarray(solution.profits_row, dtype=np.int64),
+    "nsols_row": _nsols_array(solution.nsols_row),
+  }
+  if solution.has_tables() and cache.tables:
+    arrays["profits_table"] = np.asarray(solution.profits_table, dtype=np.int64)
+    for i, row in enumerate(solution.nsols_table):
+      arrays["nsols_table_{}".format(i)] = _nsols_array(row)
+  cache.store(key, solution.optimum(), solution.n_optima(), **arrays)
+
+
+def count_optima(kpi, capacity=None, cache=None):
+  '''
+  Count global optima in O(capacity) memory
+
+  Args:
+    kpi (KnapsackInstance): Object of class KP.KnapsackInstance.KnapsackInstance
+    capacity (int)        : Knapsack capacity. Defaults to the capacity of KI if None.
+    cache (DPCache)       : Cache of DP results, see DPWB.
+  Returns:
+    Tuple (optimal profit, number of global optima).
+  '''
+  if cache is not None:
+    # the count is part of every entry, i.e. no rows are loaded
+    hit = cache.get(kpi, kpi.capacity if capacity is None else capacity, "DPWB", counts="auto", modulus=None)
+    if hit is not None:
+      return hit
+  result = DPWB(kpi, capacity=capacity, keep_tables=False, cache=cache)
+  return result.optimum(), result.n_optima()
+
+
+def DPWB_multi(kpi, capacities, cache=None):
+  '''
+  Count global optima for several capacities in a single DP pass
+
+  Args:
+    kpi (KnapsackInstance): Object of class KP.KnapsackInstance.KnapsackInstance
+    capacities (list)     : List of knapsack capacities.
+    cache (DPCache)       : Cache of DP results, see DPWB.
+  Returns:
+    List of (optimal profit, number of global optima) tuples in the order of capacities.
+  '''
+  result = DPWB(kpi, capacity=max(capacities), keep_tables=False, cache=cache)
+  return result.optima_for(capacities)
 
 
 # PROFIT-BASED-APPROACH TO COUNT ALL OPTIMA
 # ===
-# I.e. we build and (n, nP) table instead of a (n, W) table.
-# Under construction!
+# I.e. we build and (n, nP) table instead of a (n, W) table. Entry m(i, p)
+# is the minimum weight of a packing of items {1,...,i} with profit exactly p.
 #
-# Issues to solve:
-# * It is not possible to modify this approach as simple as it
-#   is for the (n,W)-approach.
-# * How to reconstruct all solutions? And since the starting point
-#   is not always the same, how to we update in case of sampling
-#   without replacement?
+# Counting is not as simple as for the (n,W)-approach: optima have profit
+# P* = max{p | m(N, p) <= W}, but not necessarily the minimum weight m(N, P*),
+# i.e. they sit in several (profit, weight) cells at or below the capacity.
+# Hence, counts are kept per (profit, weight) state. To keep the number of
+# states small, only states which can still be completed to an optimum are
+# kept; this is checked with the same table built for items {i+1,...,N}.
 
 class DPPBSolution:
+  '''
+  Dynamic Programming Profit-Based (PB) approach solution object:
+
+  Args:
+    kpi (KnapsackInstance): Object of class KP.KnapsackInstance.KnapsackInstance
+    capactiy (int): Knapsack capactiy
+    profits_table: table m(i, p) which is the minimum weight of a packing of
+    items {1,...,i} with profit exactly p (inf if there is none).
+    eps (float): FPTAS parameter the profits were scaled down with (or None).
+  Returns:
+    Object of type DPPBSolution
+  '''
   def __init__(self, kpi, capacity, profits_table, eps):
     self.kpi = kpi
     self.profits_table = profits_table
     self.N = kpi.N
     self.capacity = capacity
-    self.profit_limit = self.N * max(kpi.profits)
+    self.profit_limit = len(profits_table[0]) - 1
     self.eps = eps
+    # (profit, weight) states per stage; built on first use
+    self._layers = None
+    self._index = None
+    # number of optima; set from a cache entry or on first use
+    self._n_optima = None
+
+  def optimum(self):
+    # maximal profit p such that profits_table[N, p] <= W
+    return int(np.flatnonzero(self.profits_table[self.N] <= self.capacity).max())
 
   def optima_single(self):
     # We want just a single global optimum
+    record = instrument.start("DPPB", "optima_single", N=self.N, capacity=self.capacity)
     reconstruction = []
     i = self.kpi.N
-    j = self.profit_limit
     items = list(self.kpi.getItems())
 
-    # determine maximal profit j such that profits_table[N, j] <= W
-    j = max([k for k in range(self.profit_limit + 1) if self.profits_table[self.N][k] <= self.capacity])
+    j = self.optimum()
 
     while i > 0:
-      # traceback in the table starting from tbl[N, capacity]
+      # traceback in the table starting from tbl[N, P*]
       if self.profits_table[i][j] != self.profits_table[i - 1][j]:
         reconstruction.append(i - 1)
         j -= items[i - 1][1]  # subtract profit
       i -= 1
 
+    instrument.finish(record)
     return reconstruction
 
+  def states(self):
+    '''
+    (profit, weight) states per stage
+
+    Returns:
+      List of N+1 tuples (profits, weights, nsols) of arrays. Stage i holds all
+      states (p, w) reachable with items {1,...,i} that can still be completed to
+      a global optimum and nsols the number of packings per state.
+    '''
+    if self._layers is None:
+      record = instrument.start("DPPB", "states", N=self.N, capacity=self.capacity)
+      items = [(int(weight), int(profit)) for weight, profit in self.kpi.getItems()]
+      self._layers = _dppb_states(items, self.capacity, self.optimum())
+      if record is not None:
+        # cells are the (profit, weight) states of all stages
+        instrument.finish(record, cells=sum(len(profits) for profits, _, _ in self._layers),
+          peak_bytes=instrument.nbytes([array for layer in self._layers for array in layer]))
+    return self._layers
+
+  def _lookup(self):
+    # states of each stage as dict (p, w) -> nsols
+    if self._index is None:
+      self._index = [dict(zip(zip(profits.tolist(), weights.tolist()), nsols.tolist())) for profits, weights, nsols in self.states()]
+    return self._index
+
+  def n_optima(self):
+    if self._n_optima is None:
+      self._n_optima = int(self.states()[self.N][2].sum())
+    return self._n_optima
+
+  def optima_all(self):
+    # We want ALL global optima
+    return list(self.iter_optima())
+
+  def optima_set(self, limit=None):
+    '''
+    All global optima as a SolutionSet (see KP.solutions)
+
+    The enumeration writes into the packed bitset array directly, i.e. no
+    list of packings is built.
+
+    Args:
+      limit (int): Stop after this many optima. Defaults to all.
+    Returns:
+      SolutionSet
+    '''
+    return _optima_set(self, limit)
+
+  def iter_optima(self, bitset=False):
+    '''
+    Lazily enumerate all global optima
+
+    Same as DPWBSolution.iter_optima, but the traceback starts in each of the
+    (P*, w) states of the last stage.
+
+    Args:
+      bitset (bool): Yield packings as int bitsets (bit i set iff item i is packed)
+      instead of lists of packed items. Defaults to False.
+    Returns:
+      Generator of packings.
+    '''
+    index = self._lookup()
+    items = list(self.kpi.getItems())
+    record = instrument.start("DPPB", "iter_optima", N=self.N, capacity=self.capacity)
+    n_branches = 0
+    n_optima = 0
+    complete = False
+
+    try:
+      for p, w in index[self.N]:
+        packing = []
+        bits = 0
+        branches = []
+        i = self.N
+
+        while True:
+          while i > 0:
+            weight, profit = items[i - 1]
+            skip = (p, w) in index[i - 1]
+            if skip and (p - profit, w - weight) in index[i - 1]:
+              branches.append((i, p, w, len(packing), bits))
+              n_branches += 1
+            if not skip:
+              packing.append(i - 1)
+              bits |= 1 << (i - 1)
+              p -= profit
+              w -= weight
+            i -= 1
+
+          n_optima += 1
+          yield bits if bitset else packing[:]
+
+          if not branches:
+            break
+
+          # backtrack to the last branching point and pack the item this time
+          i, p, w, depth, bits = branches.pop()
+          del packing[depth:]
+          packing.append(i - 1)
+          bits |= 1 << (i - 1)
+          p -= items[i - 1][1]
+          w -= items[i - 1][0]
+          i -= 1
+      complete = True
+    finally:
+      # also reached if the generator is closed early
+      instrument.finish(record, branches=n_branches, optima=n_optima, complete=complete)
+
+  def _sample_single(self, rng):
+    # choose a final state and walk to the top with probabilities
+    # proportional to the number of packings of the predecessor states
+    index = self._lookup()
+    items = list(self.kpi.getItems())
 
-def DPPB(kpi, capacity = None, eps = None):
+    r = rng.randrange(self.n_optima())
+    for (p, w), nsols in index[self.N].items():
+      if r < nsols:
+        break
+      r -= nsols
+
+    packing = []
+    for i in range(self.N, 0, -1):
+      weight, profit = items[i - 1]
+      nsolsA = index[i - 1].get((p, w), 0)
+      nsolsB = index[i - 1].get((p - profit, w - weight), 0)
+      if rng.randrange(nsolsA + nsolsB) < nsolsB:
+        packing.append(i - 1)
+        p -= profit
+        w -= weight
+    return packing
+
+  def solutions_sample(self, k, replace=True, rng=None):
+    '''
+    Sample global optima uniformly at random
+
+    Args:
+      k (int): Number of samples.
+      replace (bool): Sample with replacement? If False, duplicates are rejected.
+      rng: Module random (default) or a random.Random object.
+    Returns:
+      List of k packings (lists of packed items in decreasing order).
+    '''
+    assert 1 <= k
+    n_optima = self.n_optima()
+    assert replace or k <= n_optima
+    if rng is None:
+      rng = random
+    return _sample_optima(self, k, replace, n_optima, rng)
+
+
+def _optima_set(solution, limit):
+  # enumeration into a SolutionSet; the number of optima (if exact) is a hint
+  # for the rows to allocate up front
+  reserve = 0
+  if getattr(solution, "counter", None) is None or solution.counter.exact:
+    reserve = min(solution.n_optima(), RESERVE_LIMIT if limit is None else limit)
+  solutions = SolutionSet(solution.N, reserve=reserve)
+  solutions.extend_bitsets(itertools.islice(solution.iter_optima(bitset=True), limit))
+  return solutions
+
+
+def _sample_optima(solution, k, replace, n_optima, rng):
+  # draw k optima with solution._sample_single
+  if replace:
+    return [solution._sample_single(rng) for _ in range(k)]
+
+  if 2 * k > n_optima:
+    # rejection sampling gets slow if most optima are wanted
+    return rng.sample(list(solution.iter_optima()), k)
+
+  # rejection against the bitsets of packings drawn so far
+  samples = []
+  seen = set()
+  while len(samples) < k:
+    packing = solution._sample_single(rng)
+    bits = sum(1 << item for item in packing)
+    if bits not in seen:
+      seen.add(bits)
+      samples.append(packing)
+  return samples
+
+
+def _dppb_min_weights(items, profit_limit, capacity=None):
+  '''
+  Table m(i, p) of minimum weights; inf if profit p is not reachable
+
+  Args:
+    items (list): List of (w_i, p_i) tuples.
+    profit_limit (int): Largest profit (column) of the table.
+    capacity (int): If not None, weights above the capacity are pruned, i.e. set
+    to inf, and columns beyond the largest profit reachable within the capacity
+    are skipped.
+  Returns:
+    (N+1) x (profit_limit+1) table.
+  '''
+  tbl = np.full((len(items) + 1, profit_limit + 1), np.inf)
+  tbl[0][0] = 0
+  # largest column with a finite entry
+  reach = 0
+
+  for i, (weight, profit) in enumerate(items):
+    i += 1
+    tbl[i] = tbl[i - 1]
+    if capacity is not None and weight > capacity:
+      continue
+    end = min(reach + profit, profit_limit) + 1
+    size = end - profit
+    if size > 0:
+      np.minimum(tbl[i][profit:end], tbl[i - 1][:size] + weight, out=tbl[i][profit:end])
+      if capacity is not None:
+        row = tbl[i][:end]
+        row[row > capacity] = np.inf
+      finite = np.flatnonzero(tbl[i][:end] < np.inf)
+      reach = int(finite[-1])
+
+  return tbl
+
+
+def _dppb_states(items, capacity, optimum):
+  '''
+  Forward pass over (profit, weight) states with counts
+
+  Args:
+    items (list): List of (w_i, p_i) tuples.
+    capacity (int): Knapsack capacity.
+    optimum (int): Optimal profit P*.
+  Returns:
+    See DPPBSolution.states.
+  '''
+  # minimum weights of items {i+1,...,N} to gain profit exactly q <= P*
+  back = _dppb_min_weights(items[::-1], optimum, capacity)[::-1]
+
+  profits = np.zeros(1, dtype=np.int64)
+  weights = np.zeros(1, dtype=np.int64)
+  nsols = np.ones(1, dtype=object)
+  layers = [(profits, weights, nsols)]
+
+  for i, (weight, profit) in enumerate(items):
+    i += 1
+    profits = np.concatenate([profits, profits + profit])
+    weights = np.concatenate([weights, weights + weight])
+    nsols = np.concatenate([nsols, nsols])
+
+    # keep states that can still be completed to an optimum
+    keep = profits <= optimum
+    keep[keep] = weights[keep] + back[i][optimum - profits[keep]] <= capacity
+    profits, weights, nsols = profits[keep], weights[keep], nsols[keep]
+
+    # merge equal states
+    keys = profits * (capacity + 1) + weights
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    starts = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]]))
+    profits = profits[order][starts]
+    weights = weights[order][starts]
+    nsols = np.add.reduceat(nsols[order], starts)
+
+    layers.append((profits, weights, nsols))
+
+  return layers
+
+
+def DPPB(kpi, capacity = None, eps = None, bounded = False, cache = None):
   '''
   Dynamic Programming algorithm for the 0-1 Knapsack Problem (KP)
 
@@ -171,49 +1078,170 @@ def DPPB(kpi, capacity = None, eps = None):
     kpi (KnapsackInstance): Object of class KP.KnapsackInstance.KnapsackInstance
     capacity (int)        : Knapsack capacity, i.e. maximum weight of packed items. Defaults
     to the capacity of KI if None.
-    eps (float): Number between (0,1) for FPTAS.
+    eps (float): Number between (0,1) for FPTAS. Counts, enumeration and sampling
+    then refer to the instance with scaled down profits.
+    bounded (bool): Limit the profit columns to the LP upper bound of the optimum
+    and prune weights above the capacity? Unreachable columns are skipped. Defaults
+    to False, i.e. N * max(profits) columns.
+    cache (DPCache): Cache of DP results (see KP.algorithms.cache). Entries hold the
+    table, the optimum and the number of optima, which is computed on a miss.
+    Defaults to None, i.e. no caching.
   Returns:
-    An object of class DPSolution
+    An object of class DPPBSolution
   '''
   if capacity is None:
     capacity = kpi.capacity
 
+  if cache is not None:
+    key = cache.key(kpi, capacity, "DPPB", eps=eps, bounded=bounded)
+    entry = cache.load(key)
+    if entry is not None:
+      if eps is not None:
+        kpi = kpi.scale_down_profits(eps)
+      solution = DPPBSolution(kpi = kpi, capacity = capacity, profits_table = entry["profits_table"], eps = eps)
+      solution._n_optima = entry["count"]
+      return solution
+    solution = DPPB(kpi, capacity, eps = eps, bounded = bounded)
+    cache.store(key, solution.optimum(), solution.n_optima(), profits_table = solution.profits_table)
+    return solution
+
   if eps is not None:
     assert(eps > 0 and eps < 1)
     kpi = kpi.scale_down_profits(eps)
 
   # (w_i, p_i)
-  items = list(kpi.getItems())
+  items = [(int(weight), int(profit)) for weight, profit in kpi.getItems()]
+  record = instrument.start("DPPB", "build", N=kpi.N, capacity=capacity, bounded=bounded, eps=eps)
+
+  if bounded:
+    # the optimum cannot exceed the LP relaxation
+    tbl = _dppb_min_weights(items, kpi.lp_bound(capacity), capacity)
+  else:
+    # maximum profif
+    N = kpi.N
+    P = max(kpi.profits)  # TODO: for 0-1 KP sum(kpi.profits) should also be fine
+    profit_limit = N * P
+
+    # init table: each row starts as [0, Inf, Inf, ..., Inf]
+    tbl = _dppb_min_weights(items, profit_limit)
+
+  instrument.finish(record, cells=kpi.N * len(tbl[0]), peak_bytes=tbl.nbytes)
+  return DPPBSolution(kpi = kpi, capacity = capacity, profits_table = tbl, eps = eps)
 
-  # maximum profif
-  N = kpi.N
-  P = max(kpi.profits)  # TODO: for 0-1 KP sum(kpi.profits) should also be fine
-  profit_limit = N * P
 
-  # init table(s)
-  # Each row: [0, Inf, Inf, ..., Inf]
-  tbl = [[0] + [math.inf] * (profit_limit) for _ in range(N + 1)]
-  nsols = [[1] + [0] * (profit_limit + 1) for _ in range(N + 1)]
+# SPARSE STATE-LIST APPROACH (NEMHAUSER-ULLMANN)
+# ===
+# Instead of all W+1 capacities only the (weight, profit) states of the
+# packings of items {1,...,i} are kept together with their multiplicity.
+# A state (w, p) is dropped if another state (w', p') with w' <= w and
+# p' > p exists: each completion of (w, p) is beaten by the same completion
+# of (w', p'). States with equal profit but larger weight must be kept since
+# optima may have different weights.
+
+class DPNUSolution:
+  '''
+  Sparse state-list (Nemhauser-Ullmann) approach solution object:
 
-  for i, (weight, profit) in enumerate(items):
-    i += 1
-    for p in range(profit_limit + 1):
-      if (profit > p):
-        # (i-1)-th element does not fit in
-        tbl[i][p] = tbl[i - 1][p]
-      else:
-        # otherwise check if it is of benefit to pack the item or not
-        packOptionA = tbl[i - 1][p]
-        packOptionB = tbl[i - 1][p - profit] + weight
+  Args:
+    kpi (KnapsackInstance): Object of class KP.KnapsackInstance.KnapsackInstance
+    capactiy (int): Knapsack capactiy
+    stages (list): List of N+1 tuples (weights, profits, nsols) of arrays with the
+    non-dominated states of items {1,...,i} sorted by weight and the number of
+    packings per state.
+  Returns:
+    Object of type DPNUSolution
+  '''
+  def __init__(self, kpi, capacity, stages):
+    self.kpi = kpi
+    self.stages = stages
+    self.N = kpi.N
+    self.capacity = capacity
 
-        if (packOptionA == packOptionB):
-          tbl[i][p] = packOptionA
-        elif (packOptionA < packOptionB):
-          tbl[i][p] = packOptionA
-        else:
-          tbl[i][p] = packOptionB
+  def state_sizes(self):
+    # number of states per stage; compare with capacity + 1 cells of DPWB
+    return [len(weights) for weights, _, _ in self.stages]
 
-  return DPPBSolution(kpi = kpi, capacity = capacity, profits_table = tbl, eps = eps)
+  def optimum(self):
+    return int(self.stages[self.N][1].max())
+
+  def n_optima(self):
+    _, profits, nsols = self.stages[self.N]
+    return int(nsols[profits == profits.max()].sum())
+
+  def optima_single(self):
+    # We want just a single global optimum
+    reconstruction = []
+    items = list(self.kpi.getItems())
+
+    weights, profits, _ = self.stages[self.N]
+    k = int(np.argmax(profits))
+    w, p = int(weights[k]), int(profits[k])
+
+    for i in range(self.N, 0, -1):
+      # traceback: state (w, p) stems from stage i-1 without item i-1 or with it
+      prev_weights, prev_profits, _ = self.stages[i - 1]
+      if not np.any((prev_weights == w) & (prev_profits == p)):
+        reconstruction.append(i - 1)
+        w -= items[i - 1][0]
+        p -= items[i - 1][1]
+
+    return reconstruction
+
+
+def _dpnu_stage(weights, profits, nsols, weight, profit, capacity):
+  # states of items {1,...,i} from the states of items {1,...,i-1}
+  weights = np.concatenate([weights, weights + weight])
+  profits = np.concatenate([profits, profits + profit])
+  nsols = np.concatenate([nsols, nsols])
+  if nsols.dtype != object and nsols.max() >= COUNT_LIMIT:
+    nsols = nsols.astype(object)
+
+  feasible = weights <= capacity
+  weights, profits, nsols = weights[feasible], profits[feasible], nsols[feasible]
+
+  # sort by weight and decreasing profit; both halves are sorted already,
+  # i.e. the stable sort only has to merge two runs; merge equal states
+  span = int(profits.max()) + 1
+  order = np.argsort(weights * span + (span - 1 - profits), kind="stable")
+  weights, profits, nsols = weights[order], profits[order], nsols[order]
+  starts = np.flatnonzero(np.concatenate([[True], (weights[1:] != weights[:-1]) | (profits[1:] != profits[:-1])]))
+  weights, profits = weights[starts], profits[starts]
+  nsols = np.add.reduceat(nsols, starts)
+
+  # drop states beaten by a lighter (or equally heavy) state with larger profit
+  best = np.maximum.accumulate(profits)
+  keep = np.concatenate([[True], profits[1:] >= best[:-1]])
+  return weights[keep], profits[keep], nsols[keep]
+
+
+def DPNU(kpi, capacity=None):
+  '''
+  Sparse state-list DP (Nemhauser-Ullmann) for the 0-1 Knapsack Problem (KP)
+
+  Only non-dominated (weight, profit) states are kept per stage. This pays
+  off if the number of states stays well below capacity + 1, e.g. for
+  correlated instances with large R.
+
+  Args:
+    kpi (KnapsackInstance): Object of class KP.KnapsackInstance.KnapsackInstance
+    capacity (int)        : Knapsack capacity, i.e. maximum weight of packed items. Defaults
+    to the capacity of KI if None.
+  Returns:
+    An object of class DPNUSolution
+  '''
+  if capacity is None:
+    capacity = kpi.capacity
+
+  weights = np.zeros(1, dtype=np.int64)
+  profits = np.zeros(1, dtype=np.int64)
+  nsols = np.ones(1, dtype=np.int64)
+  stages = [(weights, profits, nsols)]
+
+  for weight, profit in kpi.getItems():
+    weights, profits, nsols = _dpnu_stage(weights, profits, nsols, int(weight), int(profit), capacity)
+    stages.append((weights, profits, nsols))
+
+  return DPNUSolution(kpi=kpi, capacity=capacity, stages=stages)
 
 
 # def DPBCK_without_DPSolutionObject(kpi, capacity=None, multiGlobal=True, countOnly=False):
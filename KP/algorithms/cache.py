@@ -0,0 +1,212 @@
+import hashlib
+import os
+import tempfile
+import zipfile
+import zlib
+import numpy as np # pip install numpy
+
+# Default size budget (in bytes) of a DPCache
+MAX_BYTES = 2**30
+
+# Entries are compressed NumPy archives named <key>.npz
+SUFFIX = ".npz"
+
+
+class DPCache:
+  '''
+  Persistent content-addressed cache of DP results
+
+  Entries are keyed by a hash of the weights, the profits, the capacity, the
+  engine and its parameters, i.e. the same instance under the same capacity
+  hits the cache whichever way it was created. Each entry stores the optimal
+  profit and the number of optima together with the arrays the solution
+  object is rebuilt from: the last rows of the DPWB tables (and, if tables is
+  True, the full tables) or the table of DPPB. Entries are compressed NumPy
+  archives in a directory; the least recently used ones are removed once the
+  directory exceeds the size budget. Files are written atomically, i.e. worker
+  processes can share a cache.
+
+  Args:
+    directory (str): Cache directory. Created if it does not exist.
+    max_bytes (int): Size budget in bytes. Defaults to MAX_BYTES.
+    tables (bool): Store the full DPWB tables of runs with keep_tables=True?
+    Otherwise only the last rows are stored and such runs are never served
+    from the cache. Defaults to False.
+  '''
+  def __init__(self, directory, max_bytes=None, tables=False):
+    if max_bytes is None:
+      max_bytes = MAX_BYTES
+    os.makedirs(directory, exist_ok=True)
+    self.directory = directory
+    self.max_bytes = max_bytes
+    self.tables = tables
+    # running total of the entry sizes; the directory is only scanned once
+    # and again when the total exceeds the budget
+    self._size = None
+
+  def key(self, kpi, capacity, engine, **params):
+    '''
+    Content hash of an instance, a capacity, an engine and its parameters
+
+    Returns:
+      Hex digest (str).
+    '''
+    h = hashlib.sha256()
+    spec = [engine, int(capacity)] + ["{}={!r}".format(name, params[name]) for name in sorted(params)]
+    h.update(repr(spec).encode("utf-8"))
+    h.update(np.ascontiguousarray(kpi.weights, dtype="<i8").tobytes())
+    h.update(np.ascontiguousarray(kpi.profits, dtype="<i8").tobytes())
+    return h.hexdigest()
+
+  def _path(self, key):
+    return os.path.join(self.directory, key + SUFFIX)
+
+  def __contains__(self, key):
+    return os.path.exists(self._path(key))
+
+  def __len__(self):
+    return len(self._entries())
+
+  def load(self, key, names=None):
+    '''
+    Load an entry and mark it as recently used
+
+    Args:
+      key (str): See key().
+      names (list): Names of the arrays to load. Defaults to all arrays.
+    Returns:
+      Dictionary name -> value, or None on a miss. The number of optima is
+      decoded to an int (float for log counts) and object rows are restored.
+    '''
+    path = self._path(key)
+    try:
+      # np.load leaves the file open if the archive is corrupt
+      with open(path, "rb") as f, np.load(f, allow_pickle=False) as data:
+        if names is None:
+          names = data.files
+        entry = {name: data[name] for name in names if name in data.files}
+        objects = set(data["objects"].tolist()) if "objects" in data.files else set()
+      os.utime(path)
+    except (FileNotFoundError, ValueError, OSError, EOFError, zipfile.BadZipFile, zlib.error):
+      # evicted in the meantime or cut off by a crash
+      return None
+
+    for name in entry:
+      if name in objects:
+        # Python int counts are stored as decimal strings
+        entry[name] = np.array([int(value) for value in entry[name].tolist()], dtype=object)
+    if "optimum" in entry:
+      entry["optimum"] = int(entry["optimum"])
+    if "count" in entry:
+      count = str(entry["count"])
+      try:
+        entry["count"] = int(count)
+      except ValueError:
+        # logarithms of the counts
+        entry["count"] = float(count)
+    if "counter" in entry:
+      entry["counter"] = str(entry["counter"])
+    return entry
+
+  def get(self, kpi, capacity, engine, **params):
+    '''
+    Optimal profit and number of optima without loading any arrays
+
+    Returns:
+      Tuple (optimal profit, number of optima) or None on a miss.
+    '''
+    entry = self.load(self.key(kpi, capacity, engine, **params), names=["optimum", "count"])
+    if entry is None:
+      return None
+    return entry["optimum"], entry["count"]
+
+  def store(self, key, optimum, count, **arrays):
+    '''
+    Add (or replace) an entry and evict entries beyond the size budget
+
+    Other processes sharing the directory are only noticed when the running
+    size total exceeds the budget and the directory is scanned again.
+
+    Args:
+      key (str): See key().
+      optimum (int): Optimal profit.
+      count: Number of optima (or its logarithm / remainder).
+      arrays: Further arrays; object arrays of Python ints are allowed.
+    '''
+    data = {"optimum": np.array(int(optimum)), "count": np.array(str(count))}
+    objects = []
+    for name, value in arrays.items():
+      if isinstance(value, np.ndarray) and value.dtype == object:
+        objects.append(name)
+        value = value.astype(str)
+      data[name] = value
+    if objects:
+      data["objects"] = np.array(objects)
+
+    if self._size is None:
+      self._size = self.size()
+    path = self._path(key)
+    try:
+      replaced = os.path.getsize(path)
+    except OSError:
+      replaced = 0
+
+    fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+    try:
+      with os.fdopen(fd, "wb") as f:
+        np.savez_compressed(f, **data)
+      size = os.path.getsize(tmp)
+      os.replace(tmp, path)
+    except BaseException:
+      os.remove(tmp)
+      raise
+    self._size += size - replaced
+    if self._size > self.max_bytes:
+      self.evict()
+
+  def _entries(self):
+    # (last use, size, path) of all entries
+    entries = []
+    for name in os.listdir(self.directory):
+      if not name.endswith(SUFFIX):
+        continue
+      path = os.path.join(self.directory, name)
+      try:
+        stat = os.stat(path)
+      except FileNotFoundError:
+        continue
+      entries.append((stat.st_mtime, stat.st_size, path))
+    return entries
+
+  def size(self):
+    return sum(size for _, size, _ in self._entries())
+
+  def evict(self):
+    '''
+    Remove least recently used entries until the cache fits into max_bytes
+
+    Returns:
+      Number of removed entries.
+    '''
+    entries = sorted(self._entries())
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, path in entries:
+      if total <= self.max_bytes:
+        break
+      try:
+        os.remove(path)
+        removed += 1
+      except FileNotFoundError:
+        pass
+      total -= size
+    self._size = total
+    return removed
+
+  def clear(self):
+    for _, _, path in self._entries():
+      try:
+        os.remove(path)
+      except FileNotFoundError:
+        pass
+    self._size = 0
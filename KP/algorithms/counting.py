@@ -0,0 +1,283 @@
+import numpy as np # pip install numpy
+import math
+
+# Counts are kept as int64 as long as adding two of them cannot overflow.
+COUNT_LIMIT = 2**62
+
+# Multi-word counts are stored as base 2^32 digits (limbs) in uint64 arrays,
+# i.e. adding two limbs cannot overflow.
+LIMB_BITS = 32
+LIMB_MASK = (1 << LIMB_BITS) - 1
+
+
+class Counter:
+  '''
+  Counting backend of the vectorized DP engines
+
+  A backend defines how the number of optima is represented in a table row
+  and how the counts of the two pack options are combined. Rows are NumPy
+  arrays whose last axis is the capacity axis.
+
+  Attributes:
+    name (str): Name of the backend.
+    exact (bool): Are counts exact integers? Sampling needs exact counts.
+  '''
+  name = None
+  exact = True
+
+  def __init__(self):
+    self._scratch = None
+
+  def ones(self, size):
+    return np.ones(size, dtype=np.int64)
+
+  def prepare(self, row):
+    '''
+    Check row i-1 before row i is computed from it
+
+    Returns:
+      The row, possibly converted to a wider representation.
+    '''
+    return row
+
+  def empty_like(self, row):
+    return np.empty_like(row)
+
+  def combine(self, nsolsA, nsolsB, ge, le, out):
+    '''
+    Combine the counts of both pack options
+
+    Args:
+      nsolsA (numpy.ndarray): Counts if the item is not packed.
+      nsolsB (numpy.ndarray): Counts if the item is packed.
+      ge (numpy.ndarray): Boolean mask where option A is at least as good as B.
+      le (numpy.ndarray): Boolean mask where option B is at least as good as A.
+      out (numpy.ndarray): Output buffer.
+    Returns:
+      out, i.e. nsolsA where A > B, nsolsB where A < B and their sum on ties.
+    '''
+    np.multiply(nsolsA, ge, out=out)
+    np.add(out, np.multiply(nsolsB, le, out=self._buffer(nsolsB)), out=out)
+    return out
+
+  def _buffer(self, like):
+    # scratch buffer reused for all rows of a run
+    if self._scratch is None or self._scratch.dtype != like.dtype or self._scratch.shape[:-1] != like.shape[:-1] or self._scratch.shape[-1] < like.shape[-1]:
+      self._scratch = np.empty(like.shape[:-1] + (max(like.shape[-1], 1),), dtype=like.dtype)
+    return self._scratch[..., :like.shape[-1]]
+
+  def value(self, row, j):
+    return int(row[j])
+
+  def as_float(self, row):
+    return np.asarray(row).astype(np.float64)
+
+  def scaled(self, row, idx):
+    '''
+    Counts of a row at the given columns as mantissa * 2^exponent
+
+    Unlike as_float() this does not overflow for counts beyond the float64
+    range, i.e. ratios of counts stay finite.
+
+    Returns:
+      Tuple (mantissa, exponent) of a float64 and an int64 array.
+    '''
+    return scaled(row, idx)
+
+
+class Int64Counter(Counter):
+  '''
+  int64 counts; an OverflowError is raised once counts might overflow.
+  '''
+  name = "int64"
+
+  def prepare(self, row):
+    if row.max() >= COUNT_LIMIT:
+      raise OverflowError("Number of optima exceeds the int64 range; use another counting backend.")
+    return row
+
+
+class ObjectCounter(Counter):
+  '''
+  Python int counts in object arrays, i.e. no overflow but slow.
+  '''
+  name = "object"
+
+  def ones(self, size):
+    return np.ones(size, dtype=object)
+
+  def prepare(self, row):
+    if row.dtype != object:
+      row = row.astype(object)
+    return row
+
+
+class LimbCounter(Counter):
+  '''
+  Multi-word counts. A row has shape (L, size) and holds L base 2^32 digits
+  (least significant first) per capacity. Another limb is added whenever the
+  most significant one is in use.
+  '''
+  name = "limbs"
+
+  def ones(self, size):
+    return np.ones((1, size), dtype=np.uint64)
+
+  def prepare(self, row):
+    if row.ndim == 1:
+      row = to_limbs(row)
+    if row[-1].any():
+      row = np.vstack([row, np.zeros((1, row.shape[1]), dtype=np.uint64)])
+    return row
+
+  def combine(self, nsolsA, nsolsB, ge, le, out):
+    Counter.combine(self, nsolsA, nsolsB, ge, le, out)
+    # propagate carries
+    for k in range(out.shape[0] - 1):
+      out[k + 1] += out[k] >> np.uint64(LIMB_BITS)
+      out[k] &= np.uint64(LIMB_MASK)
+    return out
+
+  def value(self, row, j):
+    if row.ndim == 1:
+      return int(row[j])
+    return sum(int(limb) << (LIMB_BITS * k) for k, limb in enumerate(row[:, j]))
+
+  def as_float(self, row):
+    if row.ndim == 1:
+      return row.astype(np.float64)
+    return sum(limb.astype(np.float64) * 2.0**(LIMB_BITS * k) for k, limb in enumerate(row))
+
+
+class AutoCounter(LimbCounter):
+  '''
+  int64 counts while they are safe, multi-word counts once they are not.
+  '''
+  name = "auto"
+
+  def ones(self, size):
+    return np.ones(size, dtype=np.int64)
+
+  def prepare(self, row):
+    if row.ndim == 1 and row.max() < COUNT_LIMIT:
+      return row
+    return LimbCounter.prepare(self, row)
+
+  def combine(self, nsolsA, nsolsB, ge, le, out):
+    if out.ndim == 1:
+      return Counter.combine(self, nsolsA, nsolsB, ge, le, out)
+    return LimbCounter.combine(self, nsolsA, nsolsB, ge, le, out)
+
+
+class ModCounter(Counter):
+  '''
+  Counts modulo a given modulus p < 2^62.
+  '''
+  name = "mod"
+
+  def __init__(self, modulus):
+    assert 2 <= modulus < COUNT_LIMIT
+    Counter.__init__(self)
+    self.modulus = modulus
+    self.exact = False
+
+  def ones(self, size):
+    return np.full(size, 1 % self.modulus, dtype=np.int64)
+
+  def combine(self, nsolsA, nsolsB, ge, le, out):
+    Counter.combine(self, nsolsA, nsolsB, ge, le, out)
+    return np.remainder(out, self.modulus, out=out)
+
+
+class LogCounter(Counter):
+  '''
+  Natural logarithms of the counts as float64, i.e. approximate counts
+  without any overflow.
+  '''
+  name = "log"
+  exact = False
+
+  def ones(self, size):
+    return np.zeros(size, dtype=np.float64)
+
+  def combine(self, nsolsA, nsolsB, ge, le, out):
+    out[:] = np.where(ge, np.where(le, np.logaddexp(nsolsA, nsolsB), nsolsA), nsolsB)
+    return out
+
+  def value(self, row, j):
+    return float(row[j])
+
+  def as_float(self, row):
+    return np.exp(row)
+
+
+COUNTERS = {
+  "auto": AutoCounter,
+  "int64": Int64Counter,
+  "object": ObjectCounter,
+  "limbs": LimbCounter,
+  "mod": ModCounter,
+  "log": LogCounter,
+}
+
+
+def make_counter(counts="auto", modulus=None):
+  '''
+  Create a counting backend
+
+  Args:
+    counts (str): One of "auto" (int64 while safe, multi-word limbs afterwards),
+    "int64" (raise an OverflowError on overflow), "object" (Python ints),
+    "limbs" (multi-word counts), "mod" (counts modulo modulus) or "log"
+    (natural logarithm of the counts).
+    modulus (int): Modulus for counts="mod".
+  Returns:
+    Object of class Counter
+  '''
+  assert counts in COUNTERS
+  if counts == "mod":
+    assert modulus is not None
+    return ModCounter(modulus)
+  return COUNTERS[counts]()
+
+
+def to_limbs(row):
+  # int64 (or Python int) counts to a (L, size) array of base 2^32 digits
+  if row.dtype == np.int64:
+    row = row.astype(np.uint64)
+    return np.vstack([row & np.uint64(LIMB_MASK), row >> np.uint64(LIMB_BITS)])
+  values = [int(value) for value in row]
+  n_limbs = max(1, math.ceil(max(values).bit_length() / LIMB_BITS))
+  limbs = np.zeros((n_limbs, len(values)), dtype=np.uint64)
+  for k in range(n_limbs):
+    limbs[k] = [(value >> (LIMB_BITS * k)) & LIMB_MASK for value in values]
+  return limbs
+
+
+def from_limbs(row):
+  # (L, size) array of base 2^32 digits to an object array of Python ints
+  if row.ndim == 1:
+    return row
+  values = np.zeros(row.shape[1], dtype=object)
+  for k, limb in enumerate(row):
+    values += limb.astype(object) << (LIMB_BITS * k)
+  return values
+
+
+def scaled(row, idx):
+  # counts at the columns idx as mantissa * 2^exponent (see Counter.scaled)
+  idx = np.asarray(idx)
+  if row.ndim == 2:
+    # the top non-zero limb and the two below it (96 bits) with two zero limbs
+    # below limb 0, i.e. padded row p is limb p - 2
+    padded = np.vstack([np.zeros((2, row.shape[1]), dtype=np.uint64), row])[:, idx]
+    nonzero = padded != 0
+    top = np.where(nonzero.any(axis=0), len(padded) - 1 - np.argmax(nonzero[::-1], axis=0), 2)
+    cols = np.arange(len(idx))
+    mantissa = sum(padded[top - d, cols].astype(np.float64) * 2.0**(LIMB_BITS * (2 - d)) for d in range(3))
+    return mantissa, (LIMB_BITS * (top - 4)).astype(np.int64)
+  if row.dtype == object:
+    values = [int(value) for value in row[idx]]
+    shifts = [max(value.bit_length() - 64, 0) for value in values]
+    return np.array([float(value >> shift) for value, shift in zip(values, shifts)], dtype=np.float64), np.array(shifts, dtype=np.int64)
+  return row[idx].astype(np.float64), np.zeros(len(idx), dtype=np.int64)
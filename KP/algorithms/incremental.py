@@ -0,0 +1,221 @@
+from KP.knapsack import KnapsackInstance
+from KP.algorithms.DP import DPWBSolution, _WBKernel, _exact_first_row, _count_combined
+from KP.algorithms.counting import make_counter, to_limbs, from_limbs
+import numpy as np # pip install numpy
+
+
+# INCREMENTAL WEIGHT-BASED DP
+# ===
+# Forward rows F(i, .) hold m(i, j) and c(i, j) of DPWB for the items
+# {1,...,i}. Backward rows B(k, .) hold the maximum profit (and its count)
+# of packings of the items {k+1,...,N} with weight EXACTLY j. The optima of
+# all items follow from any split point k by combining F(k, c - w) with
+# B(k, w) over w = 0, ..., c: a packing of the back part with weight w can
+# only be completed to an optimum if it is the best one of its weight, and
+# then by each of the c(k, c - w) best packings of the front part.
+#
+# Appending an item adds a forward row, removing item i keeps F(0..i) and
+# B(i+1..N), and growing the capacity adds columns to the rows that are
+# kept. Missing rows are only computed when a query needs them.
+
+class IncrementalDPWB:
+  '''
+  Weight-based DP which is updated when items are added or removed or the
+  capacity grows
+
+  Args:
+    kpi (KnapsackInstance): Initial items. Defaults to no items.
+    capacity (int): Knapsack capacity. Defaults to the capacity of kpi.
+    counts (str): Exact counting backend, i.e. one of "auto", "int64",
+    "object" or "limbs" (see KP.algorithms.counting.make_counter).
+
+  Attributes:
+    weights (list): Weights of the current items.
+    profits (list): Profits of the current items.
+    capacity (int): Current capacity.
+    N: Number of items.
+  '''
+  def __init__(self, kpi=None, capacity=None, counts="auto"):
+    assert counts in ["auto", "int64", "object", "limbs"]
+    if capacity is None:
+      capacity = 0 if kpi is None else kpi.capacity
+    self.counter = make_counter(counts)
+    self.capacity = capacity
+    self.weights = []
+    self.profits = []
+    self._kernel = _WBKernel(capacity, self.counter)
+    # forward rows for the prefixes 0, ..., len(self._forward) - 1
+    self._forward = [self._kernel.first_row()]
+    # backward rows for the suffixes starting at self._start, ..., N
+    self._backward = [_exact_first_row(capacity, self.counter)]
+    self._start = 0
+    self._solution = None
+
+    if kpi is not None:
+      for weight, profit in kpi.getItems():
+        self.add_item(weight, profit)
+
+  @property
+  def N(self):
+    return len(self.weights)
+
+  def instance(self):
+    return KnapsackInstance(self.capacity, list(self.weights), list(self.profits))
+
+  def add_item(self, weight, profit):
+    '''
+    Append an item; costs one forward row at the next query
+    '''
+    self.weights.append(int(weight))
+    self.profits.append(int(profit))
+    # every suffix contains the new item
+    self._backward = [_exact_first_row(self.capacity, self.counter)]
+    self._start = self.N
+    self._solution = None
+
+  def remove_item(self, i):
+    '''
+    Remove item i (later items move up by one)
+
+    The forward rows of the items before i and the backward rows of the items
+    after i are kept, i.e. queries right after the removal combine both
+    without any DP row being computed. Backward rows are extended down to
+    item i first if necessary.
+    '''
+    assert 0 <= i < self.N
+    self._backward_to(i + 1)
+    del self._forward[i + 1:]
+    self._backward = self._backward[i + 1 - self._start:]
+    self._start = i
+    del self.weights[i]
+    del self.profits[i]
+    self._solution = None
+
+  def extend_capacity(self, capacity):
+    '''
+    Grow the capacity; only the new columns of the kept rows are computed
+    '''
+    assert capacity >= self.capacity
+    if capacity == self.capacity:
+      return
+    self.capacity = capacity
+    self._kernel = _WBKernel(capacity, self.counter)
+
+    tbl, nsols = self._kernel.first_row()
+    forward = [(tbl, nsols)]
+    for i, (row_tbl, row_nsols) in enumerate(self._forward[1:]):
+      prev_tbl, prev_nsols = forward[-1]
+      forward.append(self._extend_row(prev_tbl, prev_nsols, row_tbl, row_nsols, self.weights[i], self.profits[i]))
+    self._forward = forward
+
+    tbl, nsols = _exact_first_row(capacity, self.counter)
+    backward = [(tbl, nsols)]
+    for k in range(self.N - 1, self._start - 1, -1):
+      row_tbl, row_nsols = self._backward[k - self._start]
+      prev_tbl, prev_nsols = backward[-1]
+      backward.append(self._extend_row(prev_tbl, prev_nsols, row_tbl, row_nsols, self.weights[k], self.profits[k]))
+    self._backward = backward[::-1]
+    self._solution = None
+
+  def _extend_row(self, prev_tbl, prev_nsols, row_tbl, row_nsols, weight, profit):
+    # columns len(row_tbl), ..., capacity of a row from the extended previous row
+    old, new = len(row_tbl), len(prev_tbl)
+    prev_nsols = self.counter.prepare(prev_nsols)
+    tbl = np.empty(new - old, dtype=np.int64)
+    nsols = self.counter.empty_like(prev_nsols[..., old:new])
+
+    # the item fits in from column start on
+    start = min(max(old, weight), new)
+    k = start - old
+    tbl[:k] = prev_tbl[old:start]
+    nsols[..., :k] = prev_nsols[..., old:start]
+
+    packOptionA = prev_tbl[start:]
+    packOptionB = prev_tbl[start - weight:new - weight] + profit
+    np.maximum(packOptionA, packOptionB, out=tbl[k:])
+    self.counter.combine(prev_nsols[..., start:], prev_nsols[..., start - weight:new - weight],
+      packOptionA >= packOptionB, packOptionA <= packOptionB, out=nsols[..., k:])
+
+    return np.concatenate([row_tbl, tbl]), _concat_counts(row_nsols, nsols)
+
+  def _forward_to(self, k):
+    # compute the missing forward rows up to prefix k
+    while len(self._forward) <= k:
+      i = len(self._forward) - 1
+      tbl, nsols = self._forward[-1]
+      self._forward.append(self._kernel.row(tbl, nsols, self.weights[i], self.profits[i]))
+
+  def _backward_to(self, k):
+    # compute the missing backward rows down to suffix k
+    while self._start > k:
+      self._start -= 1
+      tbl, nsols = self._backward[0]
+      self._backward.insert(0, self._kernel.row(tbl, nsols, self.weights[self._start], self.profits[self._start]))
+
+  def _split(self):
+    # split point with a forward and a backward row; the forward rows are
+    # extended, i.e. repeated queries find F(N) and skip the combination
+    if len(self._forward) - 1 < self._start:
+      self._forward_to(self._start)
+    return len(self._forward) - 1
+
+  def optima_for(self, capacities):
+    '''
+    Optimal profit and number of global optima for capacities up to the current one
+
+    Returns:
+      List of (optimal profit, number of global optima) tuples.
+    '''
+    assert all(0 <= c <= self.capacity for c in capacities)
+    k = self._split()
+    tbl, nsols = self._forward[k]
+    value = self.counter.value
+    if k == self.N:
+      return [(int(tbl[c]), value(nsols, c)) for c in capacities]
+
+    back = self._backward[k - self._start]
+    results = []
+    for c in capacities:
+      # front gets c - w, back exactly w
+      optimum = int((tbl[c::-1] + back[0][:c + 1]).max())
+      results.append((optimum, _count_combined((tbl, nsols), back, 0, 0, c, optimum)))
+    return results
+
+  def optimum(self, capacity=None):
+    return self.optima_for([self.capacity if capacity is None else capacity])[0][0]
+
+  def n_optima(self, capacity=None):
+    return self.optima_for([self.capacity if capacity is None else capacity])[0][1]
+
+  def solution(self):
+    '''
+    DPWBSolution of the current items and capacity
+
+    All missing forward rows are computed, i.e. enumeration, sampling and
+    reconstruction are available as for DPWB with keep_tables=True.
+
+    Returns:
+      An object of class DPWBSolution
+    '''
+    if self._solution is None:
+      self._forward_to(self.N)
+      tbl = np.array([tbl for tbl, _ in self._forward])
+      nsols = [from_limbs(nsols) for _, nsols in self._forward]
+      self._solution = DPWBSolution(kpi=self.instance(), capacity=self.capacity, profits_table=tbl, nsols_table=nsols, counter=self.counter)
+    return self._solution
+
+  def optima_single(self):
+    return self.solution().optima_single()
+
+  def optima_all(self):
+    return self.solution().optima_all()
+
+
+def _concat_counts(a, b):
+  # concatenate count rows along the capacity axis in a common representation
+  if a.ndim != b.ndim:
+    a, b = [to_limbs(row) if row.ndim == 1 else row for row in (a, b)]
+  if a.ndim == 2 and a.shape[0] != b.shape[0]:
+    n_limbs = max(a.shape[0], b.shape[0])
+    a, b = [np.vstack([row, np.zeros((n_limbs - row.shape[0], row.shape[1]), dtype=row.dtype)]) for row in (a, b)]
+  return np.concatenate([a, b], axis=-1)
@@ -0,0 +1,159 @@
+import contextlib
+import json
+import time
+
+# Opt-in instrumentation of the DP engines
+# ===
+# Engines call start() at the beginning of a call and finish() at its end.
+# While no sink is installed start() returns None and the engines skip all
+# bookkeeping, i.e. the overhead is a single global lookup per call (and per
+# table row for the tie counts of DPWB).
+
+_sink = None
+_tags = {}
+
+
+class MemorySink:
+  '''
+  Keeps records in a list
+
+  Attributes:
+    records (list): List of record dictionaries in the order of the calls.
+  '''
+  def __init__(self):
+    self.records = []
+
+  def __call__(self, record):
+    self.records.append(record)
+
+
+class JSONLinesSink:
+  '''
+  Appends records to a file, one JSON object per line
+
+  Every record is written with a single append, i.e. worker processes can
+  share the file.
+
+  Args:
+    filepath (str): Output file.
+  '''
+  def __init__(self, filepath):
+    self.filepath = filepath
+
+  def __call__(self, record):
+    with open(self.filepath, "a") as f:
+      f.write(json.dumps(record) + "\n")
+
+
+def enable(sink, **tags):
+  '''
+  Install a sink
+
+  Args:
+    sink: MemorySink, JSONLinesSink or any function taking a record dictionary.
+    tags: Fields added to every record, e.g. the parameters of an experiment.
+  '''
+  global _sink, _tags
+  _sink = sink
+  _tags = tags
+
+
+def disable():
+  global _sink, _tags
+  _sink = None
+  _tags = {}
+
+
+def enabled():
+  return _sink is not None
+
+
+@contextlib.contextmanager
+def recording(sink=None, **tags):
+  '''
+  Install a sink for the duration of a with block
+
+  Args:
+    sink: See enable(). Defaults to a new MemorySink.
+    tags: See enable().
+  Returns:
+    The sink.
+  '''
+  global _sink, _tags
+  if sink is None:
+    sink = MemorySink()
+  previous = _sink, _tags
+  enable(sink, **tags)
+  try:
+    yield sink
+  finally:
+    _sink, _tags = previous
+
+
+def start(engine, call, **fields):
+  '''
+  Open a record
+
+  Args:
+    engine (str): E.g. "DPWB" or "DPPB".
+    call (str): E.g. "build", "optima_single" or "optima_all".
+    fields: Parameters of the call, e.g. N and capacity.
+  Returns:
+    Record dictionary or None if instrumentation is disabled.
+  '''
+  if _sink is None:
+    return None
+  record = dict(_tags)
+  record.update(engine=engine, call=call)
+  record.update(fields)
+  record["_start"] = time.perf_counter()
+  return record
+
+
+def finish(record, **fields):
+  '''
+  Close a record opened by start() and pass it to the sink
+
+  Args:
+    record (dict): Record returned by start(); nothing happens if None.
+    fields: Measurements, e.g. cells (number of table cells processed),
+    peak_bytes (peak table memory), ties (cells where both pack options have
+    the same profit), branches (branching points of a reconstruction).
+    cells_per_second is added if cells is given.
+  '''
+  if record is None or _sink is None:
+    return
+  seconds = time.perf_counter() - record.pop("_start")
+  record["seconds"] = seconds
+  record.update(fields)
+  if record.get("cells") is not None:
+    record["cells_per_second"] = record["cells"] / seconds if seconds > 0 else None
+  _sink(record)
+
+
+def nbytes(*arrays):
+  # memory of arrays and lists of arrays (object arrays count their pointers only)
+  total = 0
+  for array in arrays:
+    if isinstance(array, list):
+      total += nbytes(*array)
+    elif array is not None and hasattr(array, "nbytes"):
+      total += array.nbytes
+  return total
+
+
+def load(filepath):
+  '''
+  Records written by a JSONLinesSink
+
+  Returns:
+    List of record dictionaries; a line cut off by a crash is ignored.
+  '''
+  records = []
+  with open(filepath) as f:
+    for line in f:
+      try:
+        records.append(json.loads(line))
+      except ValueError:
+        break
+  return records
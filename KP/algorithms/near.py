@@ -0,0 +1,209 @@
+from KP.algorithms.DP import _dpwb_profits_row
+from KP.algorithms.counting import COUNT_LIMIT
+import random
+import numpy as np # pip install numpy
+
+# NEAR-OPTIMAL PACKINGS
+# ===
+# DPWB counts the packings of items {1,...,i} with weight at most j and
+# profit exactly m(i, j). Here the counts are kept for the profits
+# m(i, j) - d, d = 0, ..., delta, i.e. in a band below the best profit of
+# each cell. Packings further below m(i, j) cannot be completed to a packing
+# with profit at least OPT - delta: each completion adds the same profit to
+# the best packing of the cell, which stays at most OPT.
+#
+# Let s = m(i, j) - m(i-1, j) (item i not packed) and s' = m(i, j) -
+# (m(i-1, j - w_i) + p_i) (item i packed). Both are >= 0 and band entry d of
+# cell (i, j) is entry d - s of cell (i-1, j) plus entry d - s' of cell
+# (i-1, j - w_i), i.e. each row is a column-wise shift of the previous one.
+
+class NearOptimalSolution:
+  '''
+  Counts of packings with profit at least OPT - delta
+
+  Args:
+    kpi (KnapsackInstance): Object of class KP.KnapsackInstance.KnapsackInstance
+    capacity (int): Knapsack capacity
+    delta (int): Width of the profit band below the optimum.
+    rows (list): List of (profits, band) rows; profits[j] is m(i, j) and
+    band[j, d] the number of packings of items {1,...,i} with weight at most j
+    and profit m(i, j) - d. All N+1 rows if the tables were kept, otherwise
+    only the last one.
+  Returns:
+    Object of type NearOptimalSolution
+  '''
+  def __init__(self, kpi, capacity, delta, rows):
+    self.kpi = kpi
+    self.N = kpi.N
+    self.capacity = capacity
+    self.delta = delta
+    self.rows = rows
+    self.profits_row, self.band_row = rows[-1]
+
+  def has_tables(self):
+    return len(self.rows) == self.N + 1
+
+  def optimum(self):
+    return int(self.profits_row[self.capacity])
+
+  def histogram(self):
+    '''
+    Number of packings per profit in the band
+
+    Returns:
+      List of (profit, number of packings) tuples for the profits OPT, OPT - 1,
+      ..., OPT - delta (profits below 0 are left out).
+    '''
+    optimum = self.optimum()
+    return [(optimum - d, int(count)) for d, count in enumerate(self.band_row[self.capacity]) if optimum - d >= 0]
+
+  def n_near_optima(self, delta=None):
+    '''
+    Number of packings with profit at least OPT - delta
+
+    Args:
+      delta (int): At most the delta of the solution. Defaults to it.
+    '''
+    if delta is None:
+      delta = self.delta
+    assert 0 <= delta <= self.delta
+    return int(sum(self.band_row[self.capacity][:delta + 1].tolist()))
+
+  def n_optima(self):
+    return self.n_near_optima(0)
+
+  def _sample_single(self, rng, d):
+    # walk from cell (N, capacity) with profit OPT - d to the top
+    items = list(self.kpi.getItems())
+    packing = []
+    j = self.capacity
+    target = self.optimum() - d
+
+    for i in range(self.N, 0, -1):
+      weight, profit = items[i - 1]
+      prev_tbl, prev_band = self.rows[i - 1]
+      dA = int(prev_tbl[j]) - target
+      nsolsA = int(prev_band[j, dA]) if 0 <= dA <= self.delta else 0
+      nsolsB = 0
+      if j >= weight:
+        dB = int(prev_tbl[j - weight]) - (target - profit)
+        if 0 <= dB <= self.delta:
+          nsolsB = int(prev_band[j - weight, dB])
+      if rng.randrange(nsolsA + nsolsB) < nsolsB:
+        packing.append(i - 1)
+        j -= weight
+        target -= profit
+    return packing
+
+  def solutions_sample(self, k, replace=True, rng=None, delta=None):
+    '''
+    Sample packings with profit at least OPT - delta uniformly at random
+
+    The profit is drawn with probability proportional to its number of
+    packings, then a single walk through the tables picks one of them as
+    DPWBSolution.solutions_sample does for the optima.
+
+    Args:
+      k (int): Number of samples.
+      replace (bool): Sample with replacement? If False, duplicates are rejected.
+      rng: Module random (default) or a random.Random object.
+      delta (int): At most the delta of the solution. Defaults to it.
+    Returns:
+      List of k packings (lists of packed items in decreasing order).
+    '''
+    assert 1 <= k
+    if not self.has_tables():
+      raise ValueError("Sampling needs the full tables; run DPWB_near with keep_tables=True.")
+    if delta is None:
+      delta = self.delta
+    if rng is None:
+      rng = random
+    counts = [int(count) for count in self.band_row[self.capacity][:delta + 1].tolist()]
+    total = sum(counts)
+    assert replace or k <= total
+
+    samples = []
+    seen = set()
+    while len(samples) < k:
+      r = rng.randrange(total)
+      for d, count in enumerate(counts):
+        if r < count:
+          break
+        r -= count
+      packing = self._sample_single(rng, d)
+      if not replace:
+        bits = sum(1 << item for item in packing)
+        if bits in seen:
+          continue
+        seen.add(bits)
+      samples.append(packing)
+    return samples
+
+
+def _shift(band, shift, delta):
+  # out[j, d] = band[j, d - shift[j]] (0 if d < shift[j])
+  padded = np.concatenate([np.zeros((len(band), delta + 1), dtype=band.dtype), band], axis=1)
+  idx = np.clip(delta + 1 + np.arange(delta + 1)[None, :] - shift[:, None], 0, 2 * delta + 1)
+  return np.take_along_axis(padded, idx, axis=1)
+
+
+def _band_row(prev_tbl, prev_band, weight, profit, delta):
+  # row i from row i-1; cells the item does not fit in are copied
+  if prev_band.dtype != object and prev_band.max() >= COUNT_LIMIT:
+    prev_band = prev_band.astype(object)
+  tbl = prev_tbl.copy()
+  band = prev_band.copy()
+  size = len(prev_tbl) - weight
+  if size <= 0:
+    return tbl, band
+
+  packOptionA = prev_tbl[weight:]
+  packOptionB = prev_tbl[:size] + profit
+  best = np.maximum(packOptionA, packOptionB)
+  tbl[weight:] = best
+  band[weight:] = _shift(prev_band[weight:], best - packOptionA, delta) + _shift(prev_band[:size], best - packOptionB, delta)
+  return tbl, band
+
+
+def DPWB_near(kpi, capacity=None, delta=0, keep_tables=False):
+  '''
+  Count (and sample) packings with profit at least OPT - delta
+
+  Weight-based DP with counts for a band of delta + 1 profits below the best
+  profit of each cell, i.e. O(N * capacity * delta) time and O(capacity *
+  delta) memory (O(N * capacity * delta) if the tables are kept). With
+  delta=0 the counts are the numbers of optima of DPWB.
+
+  Args:
+    kpi (KnapsackInstance): Object of class KP.KnapsackInstance.KnapsackInstance
+    capacity (int)        : Knapsack capacity. Defaults to the capacity of KI if None.
+    delta (int)           : Profit tolerance. If None, the band covers all profits
+    from the optimum down to 0, i.e. histogram() is the histogram of the profits
+    of all feasible packings.
+    keep_tables (bool)    : Keep all rows? Needed for sampling. Defaults to False.
+  Returns:
+    An object of class NearOptimalSolution
+  '''
+  if capacity is None:
+    capacity = kpi.capacity
+
+  # (w_i, p_i)
+  items = [(int(weight), int(profit)) for weight, profit in kpi.getItems()]
+  if delta is None:
+    delta = int(_dpwb_profits_row(items, capacity)[capacity])
+  assert delta >= 0
+
+  tbl = np.zeros(capacity + 1, dtype=np.int64)
+  band = np.zeros((capacity + 1, delta + 1), dtype=np.int64)
+  # the empty packing
+  band[:, 0] = 1
+  rows = [(tbl, band)]
+
+  for weight, profit in items:
+    row = _band_row(rows[-1][0], rows[-1][1], weight, profit, delta)
+    if keep_tables:
+      rows.append(row)
+    else:
+      rows = [row]
+
+  return NearOptimalSolution(kpi=kpi, capacity=capacity, delta=delta, rows=rows)
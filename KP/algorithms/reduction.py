@@ -0,0 +1,216 @@
+from KP.knapsack import KnapsackInstance
+from KP.solutions import SolutionSet
+import bisect
+import itertools
+import math
+import numpy as np # pip install numpy
+
+
+class Reduction:
+  '''
+  Items fixed by reduce() and the mapping of the core back to the instance
+
+  Attributes:
+    capacity (int): Capacity left for the core, i.e. the capacity minus the
+    weights of the items fixed in.
+    items (list): Original indices of the core items; core item i is item items[i].
+    fixed_in (list): Items which are packed in every global optimum.
+    fixed_out (list): Items which are packed in no global optimum.
+    profit (int): Profit of the items fixed in.
+    lower_bound (int): Profit of a feasible packing used for the reduction.
+  '''
+  def __init__(self, capacity, items, fixed_in, fixed_out, profit, lower_bound):
+    self.capacity = capacity
+    self.items = items
+    self.fixed_in = fixed_in
+    self.fixed_out = fixed_out
+    self.profit = profit
+    self.lower_bound = lower_bound
+
+  def __str__(self):
+    return "Core items: {}\nFixed in: {}\nFixed out: {}".format(len(self.items), len(self.fixed_in), len(self.fixed_out))
+
+  def lift(self, packing):
+    # packing of the core (list of items) to a packing of the instance
+    return sorted([self.items[i] for i in packing] + self.fixed_in, reverse=True)
+
+  def lift_bitset(self, bits):
+    lifted = sum(1 << i for i in self.fixed_in)
+    for i, item in enumerate(self.items):
+      if bits >> i & 1:
+        lifted |= 1 << item
+    return lifted
+
+
+def _lp_bound_without(Wp, Pp, ws, ps, t, capacity):
+  '''
+  LP bound of the efficiency-sorted items without the item at position t
+
+  Args:
+    Wp (list): Prefix sums of the sorted weights, i.e. Wp[k] is the weight of the first k items.
+    Pp (list): Prefix sums of the sorted profits.
+    ws (list): Sorted weights.
+    ps (list): Sorted profits.
+    t (int): Position of the item to leave out.
+    capacity (int): Knapsack capacity.
+  Returns:
+    LP bound rounded down.
+  '''
+  n = len(ws)
+  if Wp[t] > capacity:
+    # the break item comes before item t
+    k = bisect.bisect_right(Wp, capacity, 0, t + 1) - 1
+    full_w, full_p, b = Wp[k], Pp[k], k
+  else:
+    k = bisect.bisect_right(Wp, capacity + ws[t], t + 1) - 1
+    if k <= t:
+      full_w, full_p, b = Wp[t], Pp[t], t + 1
+    else:
+      full_w, full_p, b = Wp[k] - ws[t], Pp[k] - ps[t], k
+
+  if b >= n:
+    return full_p
+  return full_p + ((capacity - full_w) * ps[b]) // ws[b]
+
+
+def reduce(kpi, capacity=None):
+  '''
+  Fix items via LP-relaxation bounds before exact counting
+
+  Item j is fixed to 1 (0) if the LP bound of all packings without (with)
+  item j is strictly below the profit of a greedy packing. Since the bound
+  is then strictly below the optimum, no global optimum has the other value,
+  i.e. the reduction is tie-safe and the core has exactly as many optima as
+  the instance.
+
+  Args:
+    kpi (KnapsackInstance): Object of class KP.KnapsackInstance.KnapsackInstance
+    capacity (int)        : Knapsack capacity. Defaults to the capacity of KI if None.
+  Returns:
+    Tuple (core, reduction) with core the KnapsackInstance of the remaining items
+    (capacity reduced by the items fixed in) and reduction an object of class Reduction.
+  '''
+  if capacity is None:
+    capacity = kpi.capacity
+
+  weights = [int(w) for w in kpi.weights]
+  profits = [int(p) for p in kpi.profits]
+
+  # items that do not fit in cannot be packed at all
+  fixed_out = [j for j in range(kpi.N) if weights[j] > capacity]
+  candidates = [j for j in range(kpi.N) if weights[j] <= capacity]
+
+  # sort by decreasing efficiency (see KnapsackInstance.getEfficiencies)
+  order = sorted(candidates, key=lambda j: profits[j] / weights[j] if weights[j] > 0 else math.inf, reverse=True)
+  ws = [weights[j] for j in order]
+  ps = [profits[j] for j in order]
+  Wp = [0] + list(np.cumsum(ws, dtype=np.int64).tolist())
+  Pp = [0] + list(np.cumsum(ps, dtype=np.int64).tolist())
+
+  # greedy packing as lower bound
+  lower_bound = 0
+  remaining = capacity
+  for w, p in zip(ws, ps):
+    if w <= remaining:
+      lower_bound += p
+      remaining -= w
+  lower_bound = max([lower_bound] + ps)
+
+  fixed_in = []
+  for t, j in enumerate(order):
+    # bound if item j is not packed
+    if _lp_bound_without(Wp, Pp, ws, ps, t, capacity) < lower_bound:
+      fixed_in.append(j)
+    # bound if item j is packed
+    elif ps[t] + _lp_bound_without(Wp, Pp, ws, ps, t, capacity - ws[t]) < lower_bound:
+      fixed_out.append(j)
+
+  fixed = set(fixed_in) | set(fixed_out)
+  items = [j for j in range(kpi.N) if j not in fixed]
+  reduced_capacity = capacity - sum(weights[j] for j in fixed_in)
+  core = KnapsackInstance(reduced_capacity, [kpi.weights[j] for j in items], [kpi.profits[j] for j in items])
+  reduction = Reduction(reduced_capacity, items, sorted(fixed_in), sorted(fixed_out), sum(profits[j] for j in fixed_in), lower_bound)
+  return core, reduction
+
+
+class ReducedSolution:
+  '''
+  Solution of the core of a reduced instance mapped back to the instance
+
+  Counts are the same as for the core; optimal profits and packings include
+  the items fixed in.
+
+  Args:
+    kpi (KnapsackInstance): Object of class KP.KnapsackInstance.KnapsackInstance
+    capacity (int): Knapsack capacity.
+    solution: Solution object of the core, e.g. a DPWBSolution.
+    reduction (Reduction): The reduction which lead to the core.
+  '''
+  def __init__(self, kpi, capacity, solution, reduction):
+    self.kpi = kpi
+    self.capacity = capacity
+    self.N = kpi.N
+    self.solution = solution
+    self.reduction = reduction
+
+  def optimum(self):
+    return self.solution.optimum() + self.reduction.profit
+
+  def n_optima(self):
+    return self.solution.n_optima()
+
+  def optima_for(self, capacities):
+    # the items are only fixed for the capacity of the reduction
+    if any(c != self.capacity for c in capacities):
+      raise ValueError("Items were fixed for capacity {}; run DPWB without reduce for other capacities.".format(self.capacity))
+    return [(self.optimum(), self.n_optima()) for _ in capacities]
+
+  def optima_single(self, *args, **kwargs):
+    return self.reduction.lift(self.solution.optima_single(*args, **kwargs))
+
+  def item_frequencies(self, pairwise=False, probabilities=False):
+    '''
+    Item frequencies of the core (see DPWBSolution.item_frequencies) mapped
+    back to the instance: items fixed in are part of every optimum, items
+    fixed out of none.
+    '''
+    core = self.solution.item_frequencies(pairwise=pairwise)
+    n_optima = self.n_optima()
+    items, fixed_in = self.reduction.items, self.reduction.fixed_in
+    if not pairwise:
+      counts = np.zeros(self.N, dtype=object)
+      counts[items] = core
+      counts[fixed_in] = n_optima
+    else:
+      counts = np.zeros((self.N, self.N), dtype=object)
+      counts[np.ix_(items, items)] = core
+      # a fixed item occurs with a core item in all optima of the core item
+      diagonal = np.diagonal(core) if len(items) > 0 else np.zeros(0, dtype=object)
+      counts[np.ix_(fixed_in, items)] = diagonal[None, :]
+      counts[np.ix_(items, fixed_in)] = diagonal[:, None]
+      counts[np.ix_(fixed_in, fixed_in)] = n_optima
+
+    if probabilities:
+      return (counts / n_optima).astype(np.float64)
+    return counts
+
+  def optima_all(self):
+    return list(self.iter_optima())
+
+  def optima_set(self, limit=None):
+    solutions = SolutionSet(self.N)
+    solutions.extend_bitsets(itertools.islice(self.iter_optima(bitset=True), limit))
+    return solutions
+
+  def iter_optima(self, bitset=False):
+    for packing in self.solution.iter_optima(bitset=bitset):
+      yield self.reduction.lift_bitset(packing) if bitset else self.reduction.lift(packing)
+
+  def solutions_sample(self, k, replace=True, rng=None, batched=False):
+    if not batched:
+      return [self.reduction.lift(packing) for packing in self.solution.solutions_sample(k, replace=replace, rng=rng)]
+    X_core = self.solution.solutions_sample(k, replace=replace, rng=rng, batched=True)
+    X = np.zeros((len(X_core), self.N), dtype=np.uint8)
+    X[:, self.reduction.items] = X_core
+    X[:, self.reduction.fixed_in] = 1
+    return X
@@ -0,0 +1,145 @@
+from KP.algorithms.DP import DPWB, DPPB
+
+# Default memory budget (in bytes) of solve()
+MEMORY_BUDGET = 4 * 2**30
+
+WANTS = ["count", "single", "all", "sample"]
+
+
+class MemoryBudgetExceeded(MemoryError):
+  '''
+  Raised by solve() if no engine fits into the memory budget.
+
+  Attributes:
+    estimates (dict): Estimates of all engines, see estimate().
+    budget (int): Memory budget in bytes.
+  '''
+  def __init__(self, estimates, budget):
+    self.estimates = estimates
+    self.budget = budget
+    details = ", ".join("{} needs {}".format(engine, _format_bytes(est["bytes"])) for engine, est in estimates.items())
+    MemoryError.__init__(self, "No engine fits into the memory budget of {}: {}".format(_format_bytes(budget), details))
+
+
+class SolveResult:
+  '''
+  Result of solve()
+
+  Attributes:
+    engine (str): Engine that ran, i.e. "DPWB" or "DPPB".
+    reason (str): Why the engine was chosen.
+    estimates (dict): Estimates of all engines, see estimate().
+    solution: Object of class DPWBSolution or DPPBSolution.
+    value: The wanted result, i.e. the number of optima, a single optimum,
+    the list of all optima or a list of sampled optima.
+  '''
+  def __init__(self, engine, reason, estimates, solution, value):
+    self.engine = engine
+    self.reason = reason
+    self.estimates = estimates
+    self.solution = solution
+    self.value = value
+
+  def __str__(self):
+    return "Engine: {}\nReason: {}".format(self.engine, self.reason)
+
+
+def estimate(kpi, capacity, want="count"):
+  '''
+  Estimate the cost of the DP engines
+
+  Args:
+    kpi (KnapsackInstance): Object of class KP.KnapsackInstance.KnapsackInstance
+    capacity (int)        : Knapsack capacity.
+    want (str)            : One of "count", "single", "all" or "sample".
+  Returns:
+    Dictionary engine -> {"cells": number of table cells processed,
+    "bytes": estimated peak memory of the tables}.
+  '''
+  assert want in WANTS
+  N = kpi.N
+  W = capacity + 1
+  P = kpi.lp_bound(capacity) + 1
+
+  # DPWB: int64 profits and counts; counting and a single optimum
+  # need only a few rows, enumeration and sampling need full tables
+  if want in ["count", "single"]:
+    wb_bytes = 4 * W * 8
+  else:
+    wb_bytes = (N + 1) * W * 16
+
+  # DPPB (bounded): float64 table of minimum weights; counting, enumeration and
+  # sampling need the same table for the remaining items to prune the
+  # (profit, weight) states, whose number is not known in advance
+  pb_bytes = (N + 1) * P * 8
+  if want != "single":
+    pb_bytes *= 2
+
+  return {
+    "DPWB": {"cells": N * W, "bytes": wb_bytes},
+    "DPPB": {"cells": N * P, "bytes": pb_bytes},
+  }
+
+
+def solve(kpi, capacity=None, want="count", memory_budget=None, k=1, cache=None):
+  '''
+  Solve an instance with the cheaper of the DP engines
+
+  The number of table cells of the weight-based (O(N*W)) and the bounded
+  profit-based (O(N*UB) with UB the LP upper bound) engine is estimated from
+  the instance and the engine with fewer cells among those that fit into the
+  memory budget is run.
+
+  Args:
+    kpi (KnapsackInstance): Object of class KP.KnapsackInstance.KnapsackInstance
+    capacity (int)        : Knapsack capacity. Defaults to the capacity of KI if None.
+    want (str)            : What to compute; "count" (number of optima), "single"
+    (a single optimum), "all" (all optima) or "sample" (k sampled optima).
+    memory_budget (int)   : Memory budget in bytes. Defaults to MEMORY_BUDGET.
+    k (int)               : Number of samples for want="sample".
+    cache (DPCache)       : Cache of DP results passed on to the engine, see DPWB.
+  Returns:
+    An object of class SolveResult
+  '''
+  if capacity is None:
+    capacity = kpi.capacity
+  if memory_budget is None:
+    memory_budget = MEMORY_BUDGET
+
+  estimates = estimate(kpi, capacity, want)
+  feasible = [engine for engine in estimates if estimates[engine]["bytes"] <= memory_budget]
+  if not feasible:
+    raise MemoryBudgetExceeded(estimates, memory_budget)
+
+  engine = min(feasible, key=lambda engine: estimates[engine]["cells"])
+  other = "DPPB" if engine == "DPWB" else "DPWB"
+  if other in feasible:
+    reason = "{} processes {:.3g} table cells vs. {:.3g} for {}".format(
+      engine, estimates[engine]["cells"], estimates[other]["cells"], other)
+  else:
+    reason = "{} needs {} which exceeds the memory budget of {}".format(
+      other, _format_bytes(estimates[other]["bytes"]), _format_bytes(memory_budget))
+
+  if engine == "DPWB":
+    solution = DPWB(kpi, capacity, keep_tables=want not in ["count", "single"], cache=cache)
+  else:
+    solution = DPPB(kpi, capacity, bounded=True, cache=cache)
+
+  if want == "count":
+    value = solution.n_optima()
+  elif want == "single":
+    value = solution.optima_single()
+  elif want == "all":
+    value = solution.optima_all()
+  else:
+    value = solution.solutions_sample(k)
+
+  return SolveResult(engine, reason, estimates, solution, value)
+
+
+def _format_bytes(nbytes):
+  for unit in ["B", "KiB", "MiB", "GiB"]:
+    if nbytes < 1024:
+      return "{:.1f} {}".format(nbytes, unit)
+    nbytes /= 1024
+  return "{:.1f} TiB".format(nbytes)
@@ -0,0 +1,251 @@
+import argparse
+import itertools
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+import numpy as np # pip install numpy
+from KP.knapsack import generate
+from KP.algorithms.DP import DPWB, DPPB, DPNU
+
+'''
+PERFORMANCE BASELINE
+===
+
+Times the DP engines on a grid of generated instances:
+* instance type, number of items n, upper bound R of weights and profits
+* capacity factor h, i.e. capacity h/(H+1) of the total weight as in ex02
+
+and stores the results as JSON. A later run is compared against a stored
+baseline and timings that got slower by more than a threshold are flagged:
+
+  python -m KP.experiments.benchmark run baseline.json
+  python -m KP.experiments.benchmark run current.json
+  python -m KP.experiments.benchmark compare baseline.json current.json --threshold 0.2
+'''
+
+# Capacity factors h are taken out of H+1 as in ex02
+H = 11
+
+TYPES = ["uncorr", "wcorr", "scorr", "ascorr", "invscorr", "ss"]
+
+# Enumeration of all optima is cut off after this many optima
+MAX_OPTIMA = 1000
+
+# Number of samples per sampling task
+SAMPLES = 100
+
+
+def _tables(kpi, capacity):
+  return DPWB(kpi, capacity)
+
+
+def _count(kpi, capacity):
+  return DPWB(kpi, capacity, keep_tables=False).n_optima()
+
+
+def _single_linear(kpi, capacity):
+  return DPWB(kpi, capacity, keep_tables=False).optima_single()
+
+
+def _dppb_count(kpi, capacity):
+  return DPPB(kpi, capacity, bounded=True).n_optima()
+
+
+def _dpnu_count(kpi, capacity):
+  return DPNU(kpi, capacity).n_optima()
+
+
+def _single(solution):
+  return solution.optima_single()
+
+
+def _all(solution):
+  return list(itertools.islice(solution.iter_optima(), MAX_OPTIMA))
+
+
+def _sample(solution):
+  return solution.solutions_sample(SAMPLES, rng=random.Random(1))
+
+
+def _sample_batched(solution):
+  return solution.solutions_sample(SAMPLES, rng=1, batched=True)
+
+
+# (engine, task) -> function of (instance, capacity)
+TASKS = {
+  ("DPWB", "tables"): _tables,
+  ("DPWB", "count"): _count,
+  ("DPWB", "single_linear"): _single_linear,
+  ("DPPB", "count"): _dppb_count,
+  ("DPNU", "count"): _dpnu_count,
+}
+
+# (engine, task) -> function of a DPWB solution with tables, i.e. only the
+# reconstruction or sampling is timed
+SOLUTION_TASKS = {
+  ("DPWB", "single"): _single,
+  ("DPWB", "all"): _all,
+  ("DPWB", "sample"): _sample,
+  ("DPWB", "sample_batched"): _sample_batched,
+}
+
+
+def _time(func, repeat):
+  # wall clock times of repeat calls
+  times = []
+  for _ in range(repeat):
+    start = time.perf_counter()
+    func()
+    times.append(time.perf_counter() - start)
+  return times
+
+
+def run(types=None, ns=None, Rs=None, hs=None, tasks=None, repeat=3, seed=1, progress=False):
+  '''
+  Time the DP engines on a grid of instances
+
+  Args:
+    types (list): Instance types, see KP.knapsack.generate(). Defaults to TYPES.
+    ns (list): Numbers of items. Defaults to [50, 100, 200].
+    Rs (list): Upper bounds of weights and profits. Defaults to [50, 100, 250].
+    hs (list): Capacity factors out of H+1. Defaults to [3, 6, 9].
+    tasks (list): Names "engine/task" (e.g. "DPWB/count") of the tasks to run.
+    Defaults to all tasks in TASKS and SOLUTION_TASKS.
+    repeat (int): Number of timed repetitions per task; min and median are kept.
+    seed (int): Instances only depend on the seed and their parameters.
+    progress (bool): Print a dot per instance?
+  Returns:
+    Dictionary with "meta" (versions, platform, parameters) and "results"
+    (list of dictionaries with the parameters, the capacity and the timings).
+  '''
+  if types is None:
+    types = TYPES
+  if ns is None:
+    ns = [50, 100, 200]
+  if Rs is None:
+    Rs = [50, 100, 250]
+  if hs is None:
+    hs = [3, 6, 9]
+  all_tasks = list(TASKS) + list(SOLUTION_TASKS)
+  if tasks is None:
+    tasks = all_tasks
+  else:
+    tasks = [tuple(task.split("/")) for task in tasks]
+    assert all(task in all_tasks for task in tasks)
+
+  results = []
+  for type, n, R in itertools.product(types, ns, Rs):
+    random.seed("{}-{}-{}-{}".format(seed, type, n, R))
+    kpi = generate(n, R=R, type=type)
+    for h in hs:
+      capacity = int((h / (H + 1)) * kpi.wsum())
+      solution = None
+      for engine, task in tasks:
+        if (engine, task) in TASKS:
+          times = _time(lambda: TASKS[(engine, task)](kpi, capacity), repeat)
+        else:
+          if solution is None:
+            solution = DPWB(kpi, capacity)
+          times = _time(lambda: SOLUTION_TASKS[(engine, task)](solution), repeat)
+        results.append({
+          "engine": engine, "task": task, "type": type, "n": n, "R": R, "h": h,
+          "capacity": capacity, "repeat": repeat,
+          "seconds_min": min(times), "seconds_median": statistics.median(times),
+        })
+      if progress:
+        print(".", end="", flush=True)
+
+  meta = {
+    "python": platform.python_version(),
+    "numpy": np.__version__,
+    "platform": platform.platform(),
+    "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+    "seed": seed, "repeat": repeat, "H": H,
+  }
+  return {"meta": meta, "results": results}
+
+
+def save(report, filepath):
+  with open(filepath, "w") as f:
+    json.dump(report, f, indent=1)
+
+
+def load(filepath):
+  with open(filepath) as f:
+    return json.load(f)
+
+
+def _key(result):
+  return (result["engine"], result["task"], result["type"], result["n"], result["R"], result["h"])
+
+
+def compare(baseline, current, threshold=0.1, min_seconds=1e-3, statistic="seconds_min"):
+  '''
+  Compare a benchmark report against a baseline
+
+  Args:
+    baseline (dict): Report returned by run() (or load()).
+    current (dict): Report to check.
+    threshold (float): Relative slowdown above which a timing is a regression,
+    e.g. 0.1 for more than 10% slower.
+    min_seconds (float): Timings below this in both reports are too noisy
+    to be flagged.
+    statistic (str): "seconds_min" or "seconds_median".
+  Returns:
+    List of dictionaries (parameters, baseline and current seconds, ratio and
+    regression flag) for all timings in both reports, worst ratio first.
+  '''
+  base = {_key(result): result for result in baseline["results"]}
+  rows = []
+  for result in current["results"]:
+    key = _key(result)
+    if key not in base:
+      continue
+    before, after = base[key][statistic], result[statistic]
+    ratio = after / before if before > 0 else float("inf")
+    regression = ratio > 1 + threshold and max(before, after) >= min_seconds
+    rows.append(dict(zip(["engine", "task", "type", "n", "R", "h"], key), baseline=before, current=after, ratio=ratio, regression=regression))
+  return sorted(rows, key=lambda row: row["ratio"], reverse=True)
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="Benchmark the DP engines.")
+  commands = parser.add_subparsers(dest="command", required=True)
+
+  run_parser = commands.add_parser("run", help="time the engines and write a JSON report")
+  run_parser.add_argument("output")
+  run_parser.add_argument("--types", nargs="+", default=None)
+  run_parser.add_argument("--ns", nargs="+", type=int, default=None)
+  run_parser.add_argument("--Rs", nargs="+", type=int, default=None)
+  run_parser.add_argument("--hs", nargs="+", type=int, default=None)
+  run_parser.add_argument("--tasks", nargs="+", default=None, help="e.g. DPWB/count DPWB/all")
+  run_parser.add_argument("--repeat", type=int, default=3)
+  run_parser.add_argument("--seed", type=int, default=1)
+
+  compare_parser = commands.add_parser("compare", help="flag regressions against a baseline report")
+  compare_parser.add_argument("baseline")
+  compare_parser.add_argument("current")
+  compare_parser.add_argument("--threshold", type=float, default=0.1)
+  compare_parser.add_argument("--min-seconds", type=float, default=1e-3)
+  compare_parser.add_argument("--statistic", choices=["seconds_min", "seconds_median"], default="seconds_min")
+
+  args = parser.parse_args(argv)
+  if args.command == "run":
+    report = run(args.types, args.ns, args.Rs, args.hs, args.tasks, args.repeat, args.seed, progress=True)
+    save(report, args.output)
+    print("\n{} timings written to {}".format(len(report["results"]), args.output))
+    return 0
+
+  rows = compare(load(args.baseline), load(args.current), args.threshold, args.min_seconds, args.statistic)
+  regressions = [row for row in rows if row["regression"]]
+  for row in regressions:
+    print("REGRESSION {engine}/{task} {type} n={n} R={R} h={h}: {baseline:.4g}s -> {current:.4g}s ({ratio:.2f}x)".format(**row))
+  print("{} of {} timings regressed by more than {:.0%}".format(len(regressions), len(rows), args.threshold))
+  return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,226 @@
+import concurrent.futures
+import csv
+import io
+import json
+import multiprocessing
+import os
+import time
+
+
+class Manifest:
+  '''
+  Record of the finished tasks of a resumable sweep
+
+  A JSON lines file; each line lists the tasks of a chunk whose rows were
+  written completely and the size of the results file afterwards. A line
+  which was cut off by a crash is ignored.
+
+  Args:
+    filepath (str): Manifest file. Created if it does not exist.
+  '''
+  def __init__(self, filepath):
+    self.filepath = filepath
+    self.tasks = set()
+    self.offset = None
+    if os.path.exists(filepath):
+      with open(filepath) as f:
+        for line in f:
+          try:
+            entry = json.loads(line)
+          except ValueError:
+            break
+          self.tasks.update(_task_key(task) for task in entry["tasks"])
+          self.offset = entry["offset"]
+
+  def __len__(self):
+    return len(self.tasks)
+
+  def done(self, task):
+    return _task_key(task) in self.tasks
+
+  def add(self, tasks, offset):
+    with open(self.filepath, "a") as f:
+      f.write(json.dumps({"tasks": list(tasks), "offset": offset}) + "\n")
+      f.flush()
+      os.fsync(f.fileno())
+    self.tasks.update(_task_key(task) for task in tasks)
+    self.offset = offset
+
+  def clear(self):
+    open(self.filepath, "w").close()
+    self.tasks = set()
+    self.offset = None
+
+
+def _task_key(task):
+  # tasks are parameters or tuples of parameters; JSON turns tuples into lists
+  if isinstance(task, (list, tuple)):
+    return tuple(task)
+  return task
+
+
+class ResultWriter:
+  '''
+  Aggregated output of an experiment: one space-separated file with a header
+  (as read by ex03_analyse_nr_of_optima.r) to which rows are appended as they
+  arrive.
+
+  Args:
+    filepath (str): Output file.
+    header (list): Column names.
+    manifest (Manifest): If given and it records finished tasks, the file is
+    cut back to the size recorded last, i.e. rows of unfinished chunks are
+    dropped, and rows are appended. Otherwise the file is started anew and
+    the manifest is cleared.
+  '''
+  def __init__(self, filepath, header, manifest=None):
+    self.filepath = filepath
+    self.header = header
+    offset = None if manifest is None else manifest.offset
+    if offset is not None and os.path.exists(filepath) and os.path.getsize(filepath) >= offset:
+      self.file = open(filepath, "r+", newline="")
+      self.file.truncate(offset)
+      self.file.seek(offset)
+    else:
+      if manifest is not None:
+        manifest.clear()
+      self.file = open(filepath, "w", newline="")
+      self.write([header])
+
+  def write(self, rows):
+    # one write per chunk which is on disk before the chunk is recorded as finished
+    buffer = io.StringIO()
+    csv.writer(buffer, delimiter=" ", quoting=csv.QUOTE_NONNUMERIC).writerows(rows)
+    self.file.write(buffer.getvalue())
+    self.file.flush()
+    os.fsync(self.file.fileno())
+
+  def tell(self):
+    return self.file.tell()
+
+  def close(self):
+    self.file.close()
+
+
+def make_chunks(tasks, cost, chunk_cost):
+  '''
+  Group tasks into chunks of similar estimated cost
+
+  Tasks are handled in order of decreasing cost (longest job first). A task
+  is added to the current chunk as long as the chunk stays below chunk_cost,
+  i.e. expensive tasks end up alone and cheap tasks are batched.
+
+  Args:
+    tasks (list): List of tasks.
+    cost (function): Estimated cost of a task, e.g. n * W for a DP run.
+    chunk_cost (float): Target cost per chunk.
+  Returns:
+    List of (chunk cost, list of tasks) in order of decreasing cost.
+  '''
+  chunks = []
+  current, current_cost = [], 0
+  for task in sorted(tasks, key=cost, reverse=True):
+    c = cost(task)
+    if current and current_cost + c > chunk_cost:
+      chunks.append((current_cost, current))
+      current, current_cost = [], 0
+    current.append(task)
+    current_cost += c
+  if current:
+    chunks.append((current_cost, current))
+  return sorted(chunks, key=lambda chunk: chunk[0], reverse=True)
+
+
+def _run_chunk(func, chunk):
+  # runs in a worker process; rows of each task are extended by its runtime
+  rows = []
+  for task in chunk:
+    start = time.perf_counter()
+    task_rows = func(task)
+    seconds = time.perf_counter() - start
+    rows.extend(row + [seconds] for row in task_rows)
+  return chunk, rows
+
+
+def run(func, tasks, writer, cost=None, n_jobs=None, chunk_cost=None, progress=True, manifest=None, retries=3):
+  '''
+  Run an experiment grid on a process pool
+
+  Args:
+    func (function): Module-level function mapping a task to a list of rows.
+    tasks (list): List of tasks, e.g. tuples of parameters.
+    writer (ResultWriter): Aggregated output; each row is extended by the
+    runtime of its task in seconds, i.e. the header needs one more column.
+    cost (function): Estimated cost of a task. Defaults to 1 for all tasks.
+    n_jobs (int): Number of worker processes. Defaults to the number of cores.
+    With n_jobs=1 all tasks run in the calling process.
+    chunk_cost (float): Target cost per chunk. Defaults to the total cost
+    divided by 4 * n_jobs.
+    progress (bool): Print a dot per finished chunk (and a note on retries)?
+    manifest (Manifest): Record of finished tasks. Tasks recorded already are
+    skipped and each finished chunk is recorded after its rows were written.
+    retries (int): Number of times failed chunks (e.g. a worker killed due to
+    memory pressure) are run again, each time with half the number of workers.
+  Returns:
+    Number of tasks that were run.
+  '''
+  tasks = list(tasks)
+  if manifest is not None:
+    tasks = [task for task in tasks if not manifest.done(task)]
+  if cost is None:
+    cost = lambda task: 1
+  if n_jobs is None:
+    n_jobs = multiprocessing.cpu_count()
+  if chunk_cost is None:
+    chunk_cost = sum(cost(task) for task in tasks) / (4 * n_jobs)
+
+  chunks = make_chunks(tasks, cost, chunk_cost)
+
+  while True:
+    failed = _run_chunks(func, chunks, writer, n_jobs, manifest, progress)
+    if not failed:
+      return len(tasks)
+    if retries == 0:
+      raise RuntimeError("{} chunks failed; the last error was: {!r}".format(len(failed), failed[-1][1]))
+    retries -= 1
+    n_jobs = max(1, n_jobs // 2)
+    chunks = [chunk for chunk, _ in failed]
+    if progress:
+      print("\n{} chunks failed; retrying with {} workers".format(len(chunks), n_jobs))
+
+
+def _record(writer, manifest, chunk, rows, progress):
+  writer.write(rows)
+  if manifest is not None:
+    manifest.add(chunk, writer.tell())
+  if progress:
+    print(".", end="", flush=True)
+
+
+def _run_chunks(func, chunks, writer, n_jobs, manifest, progress):
+  # runs chunks and returns the failed ones with their errors
+  failed = []
+
+  if n_jobs == 1:
+    for chunk_cost, chunk in chunks:
+      try:
+        _, rows = _run_chunk(func, chunk)
+      except Exception as error:
+        failed.append(((chunk_cost, chunk), error))
+        continue
+      _record(writer, manifest, chunk, rows, progress)
+    return failed
+
+  with concurrent.futures.ProcessPoolExecutor(max_workers=n_jobs) as pool:
+    # longest chunks are submitted first
+    futures = {pool.submit(_run_chunk, func, chunk): (chunk_cost, chunk) for chunk_cost, chunk in chunks}
+    for future in concurrent.futures.as_completed(futures):
+      try:
+        _, rows = future.result()
+      except Exception as error:
+        # includes BrokenProcessPool if a worker was killed
+        failed.append((futures[future], error))
+        continue
+      _record(writer, manifest, futures[future][1], rows, progress)
+
+  return failed
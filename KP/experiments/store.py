@@ -0,0 +1,258 @@
+import csv
+import json
+import os
+import numpy as np # pip install numpy
+
+MAGIC = b"KPRESULT"
+
+# The data section starts at a multiple of ALIGN bytes.
+ALIGN = 64
+
+# Numbers of optima can exceed the int64 range; they are stored as decimal
+# strings of at most BIGINT_DIGITS digits (2^500 has 151 digits).
+BIGINT_DIGITS = 160
+
+
+def _dtype(columns):
+  # structured dtype of the records; "bigint" columns are fixed-width bytes
+  fields = []
+  for name, kind in columns:
+    if kind == "bigint":
+      fields.append((name, "S{}".format(BIGINT_DIGITS)))
+    elif kind.startswith("str"):
+      fields.append((name, "S{}".format(int(kind[3:]))))
+    else:
+      fields.append((name, np.dtype(kind).str))
+  return np.dtype(fields)
+
+
+def _read_header(f):
+  magic = f.read(len(MAGIC))
+  if magic != MAGIC:
+    raise ValueError("{} is not a result store.".format(f.name))
+  length = int(np.frombuffer(f.read(8), dtype="<u8")[0])
+  header = json.loads(f.read(length).decode("utf-8"))
+  return header, _dtype(header["columns"]), header["offset"]
+
+
+class ResultStore:
+  '''
+  Single binary file to which result rows are appended
+
+  A JSON header with the columns and the parameter columns to index is
+  followed by the rows as records of a NumPy structured array, i.e. the file
+  can be memory-mapped by load(). Has the same interface as
+  runner.ResultWriter, i.e. it can be passed to runner.run().
+
+  Args:
+    filepath (str): Output file.
+    columns (list): List of (name, type) pairs. Types are NumPy dtypes (e.g.
+    "int64" or "float64"), "str<k>" for strings of up to k ASCII characters
+    and "bigint" for integers of arbitrary size (e.g. numbers of optima).
+    index (list): Names of the parameter columns, see ResultTable.select().
+    Defaults to all string and integer columns except bigint ones.
+    manifest (runner.Manifest): If given and it records finished tasks,
+    appending continues after the rows recorded last. Otherwise the file is
+    started anew and the manifest is cleared.
+  '''
+  def __init__(self, filepath, columns, index=None, manifest=None):
+    self.filepath = filepath
+    self.columns = [(name, kind) for name, kind in columns]
+    self.dtype = _dtype(self.columns)
+    if index is None:
+      index = [name for name, kind in self.columns if kind.startswith("str") or (kind != "bigint" and np.dtype(kind).kind in "iu")]
+    self.index = index
+
+    offset = None if manifest is None else manifest.offset
+    if offset is not None and os.path.exists(filepath) and os.path.getsize(filepath) >= offset:
+      with open(filepath, "rb") as f:
+        header, dtype, _ = _read_header(f)
+      if dtype != self.dtype:
+        raise ValueError("Columns of {} do not match.".format(filepath))
+      self.file = open(filepath, "r+b")
+      self.file.truncate(offset)
+      self.file.seek(offset)
+    else:
+      if manifest is not None:
+        manifest.clear()
+      self.file = open(filepath, "wb")
+      self._write_header()
+
+  def _write_header(self):
+    header = {"columns": self.columns, "index": self.index, "offset": 0}
+    # the offset is part of the header, i.e. compute its length with a placeholder
+    length = len(json.dumps(dict(header, offset=10**12)).encode("utf-8"))
+    offset = -(-(len(MAGIC) + 8 + length) // ALIGN) * ALIGN
+    header["offset"] = offset
+    data = json.dumps(header).encode("utf-8")
+    data += b" " * (offset - len(MAGIC) - 8 - len(data))
+    self.file.write(MAGIC + np.array([len(data)], dtype="<u8").tobytes() + data)
+    self.file.flush()
+
+  def records(self, rows):
+    '''
+    Convert rows (lists in column order) to records
+
+    Returns:
+      numpy.ndarray with the structured dtype of the store.
+    '''
+    records = np.zeros(len(rows), dtype=self.dtype)
+    for j, (name, kind) in enumerate(self.columns):
+      values = [row[j] for row in rows]
+      if kind == "bigint" or kind.startswith("str"):
+        values = [str(value).encode("ascii") for value in values]
+        width = self.dtype[name].itemsize
+        if any(len(value) > width for value in values):
+          raise ValueError("Value of column {} exceeds {} characters.".format(name, width))
+      records[name] = values
+    return records
+
+  def write(self, rows):
+    # one write per chunk which is on disk before the chunk is recorded as finished
+    self.file.write(self.records(rows).tobytes())
+    self.file.flush()
+    os.fsync(self.file.fileno())
+
+  def tell(self):
+    return self.file.tell()
+
+  def close(self):
+    self.file.close()
+
+
+class ResultTable:
+  '''
+  Memory-mapped rows of a result store, see load()
+
+  Attributes:
+    columns (list): List of (name, type) pairs.
+    index (list): Names of the parameter columns.
+    records (numpy.memmap): Rows as records of a structured array.
+  '''
+  def __init__(self, filepath):
+    with open(filepath, "rb") as f:
+      header, dtype, offset = _read_header(f)
+    self.columns = [tuple(column) for column in header["columns"]]
+    self.index = header["index"]
+    self.kinds = dict(self.columns)
+    # a record cut off by a crash is ignored
+    n_rows = (os.path.getsize(filepath) - offset) // dtype.itemsize
+    if n_rows > 0:
+      self.records = np.memmap(filepath, dtype=dtype, mode="r", offset=offset, shape=(n_rows,))
+    else:
+      self.records = np.zeros(0, dtype=dtype)
+    self._groups = {}
+
+  def __len__(self):
+    return len(self.records)
+
+  def column(self, name, rows=None, decode=True):
+    '''
+    Values of a column
+
+    Args:
+      name (str): Column name.
+      rows: Row selection, e.g. the result of select(). Defaults to all rows.
+      decode (bool): Convert strings to str and bigints to Python ints?
+      Otherwise the stored bytes are returned.
+    Returns:
+      numpy.ndarray (an object array for bigint columns).
+    '''
+    values = self.records[name]
+    if rows is not None:
+      values = values[rows]
+    kind = self.kinds[name]
+    if decode and kind.startswith("str"):
+      return np.char.decode(values, "ascii")
+    if decode and kind == "bigint":
+      return np.array([int(value) for value in values], dtype=object)
+    return values
+
+  def _group(self, names):
+    # index: rows grouped by the values of the given parameter columns
+    names = tuple(names)
+    if names not in self._groups:
+      keys = [np.asarray(self.records[name]) for name in names]
+      order = np.lexsort(keys[::-1])
+      sorted_keys = [key[order] for key in keys]
+      # a group starts where any of the sorted keys changes
+      change = np.zeros(len(order), dtype=bool)
+      change[:1] = True
+      for key in sorted_keys:
+        change[1:] |= key[1:] != key[:-1]
+      bounds = list(np.flatnonzero(change)) + [len(order)]
+      groups = {}
+      for a, b in zip(bounds[:-1], bounds[1:]):
+        groups[tuple(key[a].item() for key in sorted_keys)] = np.sort(order[a:b])
+      self._groups[names] = groups
+    return self._groups[names]
+
+  def _encode(self, name, value):
+    if self.kinds[name].startswith("str") or self.kinds[name] == "bigint":
+      return str(value).encode("ascii")
+    return value
+
+  def select(self, **filters):
+    '''
+    Rows matching the filters
+
+    Filters on index columns with single values are answered by a lookup in
+    the index (built on first use); other filters (lists of values or columns
+    which are not indexed) by a scan of the column.
+
+    Args:
+      filters: column=value or column=[values], e.g. generator="uncorr", n=[50, 100].
+    Returns:
+      Sorted numpy.ndarray of row numbers.
+    '''
+    lookup = {name: value for name, value in filters.items() if name in self.index and not isinstance(value, (list, tuple, set))}
+    if lookup:
+      names = sorted(lookup)
+      key = tuple(self._encode(name, lookup[name]) for name in names)
+      rows = self._group(names).get(key, np.zeros(0, dtype=np.int64))
+    else:
+      rows = np.arange(len(self.records))
+    for name, value in filters.items():
+      if name in lookup:
+        continue
+      values = value if isinstance(value, (list, tuple, set)) else [value]
+      mask = np.isin(self.records[name][rows], [self._encode(name, v) for v in values])
+      rows = rows[mask]
+    return rows
+
+
+def load(filepath, columns=None, **filters):
+  '''
+  Load a result store
+
+  Args:
+    filepath (str): Path to a file written by a ResultStore.
+    columns (list): Names of the columns to load. Defaults to all columns.
+    filters: Row filters, see ResultTable.select().
+  Returns:
+    Dictionary column name -> numpy.ndarray of the selected rows.
+  '''
+  table = ResultTable(filepath)
+  if columns is None:
+    columns = [name for name, _ in table.columns]
+  rows = table.select(**filters) if filters else None
+  return {name: table.column(name, rows) for name in columns}
+
+
+def to_csv(filepath, outpath, columns=None, **filters):
+  '''
+  Export (parts of) a result store to the space-separated CSV format read
+  by ex03_analyse_nr_of_optima.r
+
+  Args:
+    filepath (str): Path to a file written by a ResultStore.
+    outpath (str): Path of the CSV file.
+    columns (list): Names of the columns to export. Defaults to all columns.
+    filters: Row filters, see ResultTable.select().
+  '''
+  data = load(filepath, columns, **filters)
+  names = list(data)
+  with open(outpath, "w", newline="") as f:
+    writer = csv.writer(f, delimiter=" ", quoting=csv.QUOTE_NONNUMERIC)
+    writer.writerow(names)
+    writer.writerows(zip(*(data[name].tolist() for name in names)))
@@ -3,6 +3,13 @@ import sys
 import os
 import csv
 import math
+import itertools
+import numpy as np # pip install numpy
+
+# Binary instance format (see KnapsackInstance.save_binary): a fixed-size
+# header followed by the weights and the profits as contiguous arrays.
+BINARY_MAGIC = b"KPINST1"
+BINARY_HEADER = np.dtype([("magic", "S8"), ("dtype", "S8"), ("n", "<u8"), ("capacity", "<i8")])
 
 class KnapsackInstance:
   '''
@@ -37,6 +44,34 @@ class KnapsackInstance:
   def getEfficiencies(self):
     return [self.profits[i] / self.weights[i] for i in range(self.N)]
 
+  def lp_bound(self, capacity = None):
+    '''
+    Dantzig upper bound, i.e. the optimum of the LP relaxation rounded down
+
+    Items are packed in order of decreasing efficiency until the break item,
+    of which only a fraction fits in. Items heavier than the capacity are
+    left out since they cannot be part of any feasible packing.
+
+    Args:
+      capacity (int): Knapsack capacity. Defaults to the capacity of the instance.
+    Returns:
+      Integer upper bound on the optimal profit.
+    '''
+    if capacity is None:
+      capacity = self.capacity
+    items = sorted([(w, p) for w, p in self.getItems() if w <= capacity],
+      key = lambda wp: wp[1] / wp[0] if wp[0] > 0 else math.inf, reverse = True)
+
+    bound = 0
+    remaining = capacity
+    for w, p in items:
+      if w > remaining:
+        # break item
+        return int(bound + (p * remaining) // w)
+      bound += p
+      remaining -= w
+    return int(bound)
+
   def evaluate(self, x):
     return self.wsum(x), self.psum(x)
 
@@ -104,6 +139,218 @@ class KnapsackInstance:
       ps = [p for (_, p) in wps]
       return cls(capacity, ws, ps)
 
+  def save_binary(self, filepath, overwrite = False):
+    '''
+    Save in the binary instance format
+
+    The file consists of a 32 byte header (magic, dtype, n and the capacity,
+    -1 if None) followed by the weights and the profits as little-endian
+    int32 arrays, or int64 arrays if some value exceeds the int32 range.
+
+    Args:
+      filepath (str): Output file.
+      overwrite (bool): Overwrite an existing file? If False (default) an
+      existing file is left alone and False is returned like save() does.
+    Returns:
+      True if the file was written.
+    '''
+    if os.path.exists(filepath) and not overwrite:
+      print("File '{}' already exists!".format(filepath))
+      return False
+
+    dtype = binary_dtype(self.weights, self.profits)
+    header = np.array([(BINARY_MAGIC, dtype.str.encode("ascii"), self.N, -1 if self.capacity is None else self.capacity)], dtype = BINARY_HEADER)
+    with open(filepath, "wb") as f:
+      f.write(header.tobytes())
+      f.write(np.asarray(self.weights, dtype = dtype).tobytes())
+      f.write(np.asarray(self.profits, dtype = dtype).tobytes())
+    return True
+
+  @classmethod
+  def load_binary(cls, filepath, mmap = True):
+    '''
+    Load an instance saved by save_binary()
+
+    Args:
+      filepath (str): Path to the file.
+      mmap (bool): Memory-map the weights and profits (zero-copy, read-only
+      NumPy arrays)? Otherwise they are read into memory.
+    Returns:
+      KnapsackInstance with NumPy arrays as weights and profits.
+    '''
+    header = np.fromfile(filepath, dtype = BINARY_HEADER, count = 1)
+    if len(header) == 0 or header["magic"][0] != BINARY_MAGIC:
+      raise ValueError("{} is not a binary knapsack instance.".format(filepath))
+    dtype = np.dtype(header["dtype"][0].decode("ascii"))
+    n = int(header["n"][0])
+    capacity = int(header["capacity"][0])
+    if mmap and n > 0:
+      data = np.memmap(filepath, dtype = dtype, mode = "r", offset = BINARY_HEADER.itemsize, shape = (2, n))
+    else:
+      data = np.fromfile(filepath, dtype = dtype, count = 2 * n, offset = BINARY_HEADER.itemsize).reshape(2, n)
+    return cls(None if capacity < 0 else capacity, data[0], data[1])
+
+
+class ArrayKnapsackInstance:
+  '''
+  0-1 Knapsack Object backed by NumPy arrays
+
+  Same interface as KnapsackInstance (and accepted wherever one is), but
+  weights and profits are int64 arrays, sums are computed without Python
+  loops and evaluate_many() evaluates batches of packings in one call.
+
+  Args:
+    capacity (int): Knapsack packing limit
+    weights (list): Integer weights (list or array)
+    profits (list): Integer profits (list or array)
+  '''
+  __slots__ = ("weights", "profits", "capacity", "N")
+
+  def __init__(self, capacity, weights, profits):
+    assert len(weights) == len(profits)
+
+    self.weights = np.ascontiguousarray(weights, dtype = np.int64)
+    self.profits = np.ascontiguousarray(profits, dtype = np.int64)
+    self.capacity = capacity
+    self.N = len(self.weights)
+
+  @classmethod
+  def from_instance(cls, kpi):
+    return cls(kpi.capacity, kpi.weights, kpi.profits)
+
+  def to_instance(self):
+    return KnapsackInstance(self.capacity, self.weights.tolist(), self.profits.tolist())
+
+  __str__ = KnapsackInstance.__str__
+  lp_bound = KnapsackInstance.lp_bound
+  save = KnapsackInstance.save
+  save_binary = KnapsackInstance.save_binary
+
+  def getItems(self):
+    return zip(self.weights.tolist(), self.profits.tolist())
+
+  def getEfficiencies(self):
+    return self.profits / self.weights
+
+  def evaluate(self, x):
+    return self.wsum(x), self.psum(x)
+
+  def wsum(self, x = None):
+    if x is None:
+      return int(self.weights.sum())
+    return int(self.weights @ np.asarray(x, dtype = np.int64))
+
+  def wsumint(self, x):
+    return int(self.weights[np.asarray(x, dtype = np.intp)].sum())
+
+  def psum(self, x = None):
+    if x is None:
+      return int(self.profits.sum())
+    return int(self.profits @ np.asarray(x, dtype = np.int64))
+
+  def psumint(self, x):
+    return int(self.profits[np.asarray(x, dtype = np.intp)].sum())
+
+  def to_bitstring(self, x):
+    bs = np.zeros(self.N, dtype = np.uint8)
+    bs[np.asarray(x, dtype = np.intp)] = 1
+    return bs
+
+  def scale_down_profits(self, eps):
+    return ArrayKnapsackInstance.from_instance(KnapsackInstance.scale_down_profits(self, eps))
+
+  def evaluate_many(self, X, kind = None):
+    '''
+    Weights and profits of many packings at once
+
+    Args:
+      X: Packings in one of the following representations:
+      "matrix": 2-D array of 0/1 (bool or integer, but not uint64) with one row per packing,
+      "packed": 2-D uint64 array, bit i % 64 of word i // 64 of a row is item i (see pack_bits()),
+      "bitsets": list of Python ints, bit i is item i (see DPWBSolution.iter_optima(bitset=True)),
+      "indices": list of lists of item numbers (see DPWBSolution.optima_all()).
+      kind (str): Representation of X; inferred from X if None, i.e. uint64
+      arrays are packed, other arrays are matrices, lists of ints are bitsets
+      and other lists are index lists.
+    Returns:
+      Tuple (weights, profits) of int64 arrays with one entry per packing.
+    '''
+    if kind is None:
+      if isinstance(X, np.ndarray):
+        kind = "packed" if X.dtype == np.uint64 else "matrix"
+      else:
+        X = list(X)
+        kind = "bitsets" if len(X) > 0 and isinstance(X[0], (int, np.integer)) else "indices"
+    assert kind in ["matrix", "packed", "bitsets", "indices"]
+
+    if kind == "indices":
+      lengths = np.fromiter((len(x) for x in X), dtype = np.int64, count = len(X))
+      items = np.fromiter(itertools.chain.from_iterable(X), dtype = np.intp, count = int(lengths.sum()))
+      rows = np.repeat(np.arange(len(X)), lengths)
+      # exact int64 sums (np.bincount sums in float64)
+      result = np.zeros((2, len(X)), dtype = np.int64)
+      np.add.at(result[0], rows, self.weights[items])
+      np.add.at(result[1], rows, self.profits[items])
+      return result[0], result[1]
+
+    if kind == "bitsets":
+      X = bitsets_to_packed(X, self.N)
+      kind = "packed"
+
+    WP = np.stack([self.weights, self.profits], axis = 1)
+    if kind == "matrix":
+      X = np.asarray(X)
+      assert X.ndim == 2 and X.shape[1] == self.N
+      result = X.astype(np.int64, copy = False) @ WP
+    else:
+      # unpack blocks of rows to keep the 0/1 matrix small
+      X = np.asarray(X, dtype = np.uint64)
+      result = np.empty((len(X), 2), dtype = np.int64)
+      block = max(1, 2**24 // max(self.N, 1))
+      for start in range(0, len(X), block):
+        result[start:start + block] = unpack_bits(X[start:start + block], self.N) @ WP
+    return result[:, 0].copy(), result[:, 1].copy()
+
+
+def pack_bits(X):
+  '''
+  Pack a 0/1 matrix (one packing per row) into uint64 words
+
+  Returns:
+    Array of shape (rows, ceil(N / 64)); bit i % 64 of word i // 64 is item i.
+  '''
+  X = np.asarray(X, dtype = bool)
+  n_words = -(-X.shape[1] // 64)
+  packed = np.packbits(X, axis = 1, bitorder = "little")
+  padded = np.zeros((X.shape[0], 8 * n_words), dtype = np.uint8)
+  padded[:, :packed.shape[1]] = packed
+  return padded.view("<u8").astype(np.uint64)
+
+
+def unpack_bits(P, n):
+  '''
+  Unpack uint64 words (see pack_bits) into a 0/1 uint8 matrix with n columns
+  '''
+  P = np.ascontiguousarray(P, dtype = "<u8")
+  return np.unpackbits(P.view(np.uint8), axis = 1, count = n, bitorder = "little")
+
+
+def bitsets_to_packed(bitsets, n):
+  '''
+  Python int bitsets (bit i is item i) to packed uint64 words (see pack_bits)
+  '''
+  n_words = max(1, -(-n // 64))
+  data = b"".join(int(bits).to_bytes(8 * n_words, "little") for bits in bitsets)
+  return np.frombuffer(data, dtype = "<u8").astype(np.uint64).reshape(-1, n_words)
+
+
+def binary_dtype(*arrays):
+  '''
+  Smallest of little-endian int32 and int64 which holds all values
+  '''
+  limit = max([0] + [int(np.max(np.abs(np.asarray(a, dtype = np.int64)))) for a in arrays if len(a) > 0])
+  return np.dtype("<i4") if limit < 2**31 else np.dtype("<i8")
+
 
 def generate(n, R, type, L = 1):
   '''
@@ -157,3 +404,94 @@ def generate(n, R, type, L = 1):
 
   return KnapsackInstance(None, ws, ps)
 
+
+
+class InstanceBatch:
+  '''
+  Instances of the same size stacked into arrays, see generate_batch()
+
+  Args:
+    weights (numpy.ndarray): int64 array of shape (m, n), one instance per row.
+    profits (numpy.ndarray): int64 array of shape (m, n).
+    capacities (list): Capacities of the instances; None for all if None.
+
+  Attributes:
+    weights, profits, capacities: See above.
+    n: Number of items per instance.
+  '''
+  def __init__(self, weights, profits, capacities = None):
+    assert weights.shape == profits.shape
+    self.weights = weights
+    self.profits = profits
+    self.capacities = [None] * len(weights) if capacities is None else list(capacities)
+    self.n = weights.shape[1]
+
+  def __len__(self):
+    return len(self.weights)
+
+  def __getitem__(self, i):
+    # rows are views, i.e. no copies
+    return ArrayKnapsackInstance(self.capacities[i], self.weights[i], self.profits[i])
+
+  def __iter__(self):
+    for i in range(len(self)):
+      yield self[i]
+
+
+def generate_batch(m, n, R, type, L = 1, seed = None):
+  '''
+  Generate m knapsack instances at once
+
+  Same instance types and distributions as generate(), but every instance
+  is drawn with vectorized calls from its own NumPy Generator. The streams
+  are spawned from a single SeedSequence, i.e. instance i only depends on
+  the seed and i, not on the number of instances, the process or the order
+  in which instances are generated.
+
+  Args:
+    m (int): Number of instances.
+    n, R, type, L: See generate().
+    seed: Seed (int, sequence of ints or numpy.random.SeedSequence). Fresh
+    entropy from the OS if None.
+
+  Returns:
+    InstanceBatch
+  '''
+  assert m >= 0
+  assert n >= 1
+  assert R >= L
+  assert type in ["uncorr", "wcorr", "scorr", "ascorr", "invscorr", "ss", "usw"]
+
+  if not isinstance(seed, np.random.SeedSequence):
+    seed = np.random.SeedSequence(seed)
+
+  R10 = round(R / 10)
+  R500 = round(R / 500)
+
+  weights = np.empty((m, n), dtype = np.int64)
+  profits = np.empty((m, n), dtype = np.int64)
+  for i, child in enumerate(seed.spawn(m)):
+    rng = np.random.default_rng(child)
+    # upper limits of Generator.integers are exclusive
+    ws = rng.integers(L, R + 1, size = n)
+    if type == "uncorr":
+      ps = rng.integers(L, R + 1, size = n)
+    elif type == "wcorr":
+      ps = np.maximum(rng.integers(ws - R10, ws + R10 + 1), 1)
+    elif type == "scorr":
+      ps = ws + R10
+    elif type == "ascorr":
+      ps = rng.integers(ws + R10 - R500, ws + R10 + R500 + 1)
+    elif type == "invscorr":
+      ps = rng.integers(L, R + 1, size = n)
+      ws = ps + R10
+    elif type == "ss":
+      ps = ws
+    else:
+      # usw
+      ws = rng.integers(100000, 100101, size = n)
+      ps = rng.integers(1, 1001, size = n)
+    weights[i] = ws
+    profits[i] = ps
+
+  return InstanceBatch(weights, profits)
@@ -0,0 +1,164 @@
+from KP.knapsack import KnapsackInstance, binary_dtype, BINARY_MAGIC
+import argparse
+import glob
+import os
+import numpy as np # pip install numpy
+
+'''
+Instance libraries: many instances in a single binary container file
+
+Layout (all little-endian):
+* header: magic, dtype of the arrays, number of instances m
+* index: m records (n, capacity (-1 if None), byte offset of the data)
+* data: weights and profits of each instance as contiguous arrays
+'''
+
+LIBRARY_MAGIC = b"KPLIB1"
+LIBRARY_HEADER = np.dtype([("magic", "S8"), ("dtype", "S8"), ("count", "<u8"), ("reserved", "<u8")])
+LIBRARY_INDEX = np.dtype([("n", "<u8"), ("capacity", "<i8"), ("offset", "<u8")])
+
+
+def save_library(filepath, instances, overwrite = False):
+  '''
+  Save instances in a single container file
+
+  Args:
+    filepath (str): Output file.
+    instances (list): List of KnapsackInstance objects.
+    overwrite (bool): Overwrite an existing file?
+  Returns:
+    True if the file was written.
+  '''
+  if os.path.exists(filepath) and not overwrite:
+    print("File '{}' already exists!".format(filepath))
+    return False
+
+  instances = list(instances)
+  dtype = binary_dtype(*([kpi.weights for kpi in instances] + [kpi.profits for kpi in instances]))
+  index = np.zeros(len(instances), dtype = LIBRARY_INDEX)
+  offset = LIBRARY_HEADER.itemsize + index.nbytes
+  for i, kpi in enumerate(instances):
+    index[i] = (kpi.N, -1 if kpi.capacity is None else kpi.capacity, offset)
+    offset += 2 * kpi.N * dtype.itemsize
+
+  header = np.array([(LIBRARY_MAGIC, dtype.str.encode("ascii"), len(instances), 0)], dtype = LIBRARY_HEADER)
+  with open(filepath, "wb") as f:
+    f.write(header.tobytes())
+    f.write(index.tobytes())
+    for kpi in instances:
+      f.write(np.asarray(kpi.weights, dtype = dtype).tobytes())
+      f.write(np.asarray(kpi.profits, dtype = dtype).tobytes())
+  return True
+
+
+class InstanceLibrary:
+  '''
+  Memory-mapped container file written by save_library()
+
+  Instances are created on access; their weights and profits are read-only
+  views into the mapped file, i.e. nothing is copied or parsed.
+
+  Args:
+    filepath (str): Path to the container file.
+  '''
+  def __init__(self, filepath):
+    header = np.fromfile(filepath, dtype = LIBRARY_HEADER, count = 1)
+    if len(header) == 0 or header["magic"][0] != LIBRARY_MAGIC:
+      raise ValueError("{} is not an instance library.".format(filepath))
+    self.filepath = filepath
+    self.dtype = np.dtype(header["dtype"][0].decode("ascii"))
+    count = int(header["count"][0])
+    self.index = np.fromfile(filepath, dtype = LIBRARY_INDEX, count = count, offset = LIBRARY_HEADER.itemsize)
+    self.data = np.memmap(filepath, dtype = np.uint8, mode = "r")
+
+  def __len__(self):
+    return len(self.index)
+
+  def __getitem__(self, i):
+    n, capacity, offset = (int(value) for value in self.index[i])
+    nbytes = n * self.dtype.itemsize
+    weights = self.data[offset:offset + nbytes].view(self.dtype)
+    profits = self.data[offset + nbytes:offset + 2 * nbytes].view(self.dtype)
+    return KnapsackInstance(None if capacity < 0 else capacity, weights, profits)
+
+  def __iter__(self):
+    for i in range(len(self)):
+      yield self[i]
+
+
+def text_to_library(filepaths, filepath, overwrite = False):
+  '''
+  Pack instances in the text format (see KnapsackInstance.save) into a library
+
+  Returns:
+    True if the file was written.
+  '''
+  return save_library(filepath, [KnapsackInstance.load(path) for path in filepaths], overwrite = overwrite)
+
+
+def library_to_text(filepath, outdir, names = None):
+  '''
+  Unpack a library into files in the text format
+
+  Args:
+    filepath (str): Path to the container file.
+    outdir (str): Output directory.
+    names (list): File names; defaults to 0.csv, 1.csv, ...
+  Returns:
+    List of the written files.
+  '''
+  library = InstanceLibrary(filepath)
+  if names is None:
+    names = ["{}.csv".format(i) for i in range(len(library))]
+  os.makedirs(outdir, exist_ok = True)
+  written = []
+  for name, kpi in zip(names, library):
+    path = os.path.join(outdir, name)
+    if KnapsackInstance(kpi.capacity, kpi.weights.tolist(), kpi.profits.tolist()).save(path):
+      written.append(path)
+  return written
+
+
+def convert(src, dst, overwrite = False):
+  '''
+  Convert a single instance between the text format and the binary format
+  of KnapsackInstance.save_binary(); the direction is given by the magic of src.
+
+  Returns:
+    True if the file was written.
+  '''
+  with open(src, "rb") as f:
+    binary = f.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+  if binary:
+    kpi = KnapsackInstance.load_binary(src, mmap = False)
+    kpi = KnapsackInstance(kpi.capacity, kpi.weights.tolist(), kpi.profits.tolist())
+    if os.path.exists(dst) and overwrite:
+      os.remove(dst)
+    return kpi.save(dst)
+  return KnapsackInstance.load(src).save_binary(dst, overwrite = overwrite)
+
+
+if __name__ == "__main__":
+  # e.g. python -m KP.library pack data/example_instances/*.csv instances.kplib
+  parser = argparse.ArgumentParser(description = "Convert knapsack instances between the text and the binary formats.")
+  subparsers = parser.add_subparsers(dest = "command", required = True)
+  pack = subparsers.add_parser("pack", help = "pack text instances into a library")
+  pack.add_argument("instances", nargs = "+")
+  pack.add_argument("library")
+  pack.add_argument("--overwrite", action = "store_true")
+  unpack = subparsers.add_parser("unpack", help = "unpack a library into text instances")
+  unpack.add_argument("library")
+  unpack.add_argument("outdir")
+  single = subparsers.add_parser("convert", help = "convert a single instance (text <-> binary)")
+  single.add_argument("src")
+  single.add_argument("dst")
+  single.add_argument("--overwrite", action = "store_true")
+  args = parser.parse_args()
+
+  if args.command == "pack":
+    paths = sorted(path for pattern in args.instances for path in glob.glob(pattern))
+    text_to_library(paths, args.library, overwrite = args.overwrite)
+  elif args.command == "unpack":
+    library_to_text(args.library, args.outdir)
+  else:
+    convert(args.src, args.dst, overwrite = args.overwrite)
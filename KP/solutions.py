@@ -0,0 +1,263 @@
+from KP.knapsack import ArrayKnapsackInstance, pack_bits, unpack_bits, bitsets_to_packed
+import itertools
+import os
+import numpy as np # pip install numpy
+
+'''
+Solution sets: many packings of the same instance as packed bitset rows
+
+Row r of the (count, ceil(N / 64)) uint64 array is a packing; bit i % 64 of
+word i // 64 is item i (see KP.knapsack.pack_bits). A packing of 500 items
+takes 64 bytes instead of a Python list of up to 500 ints.
+
+File layout (all little-endian): header (magic, N, count) and the words.
+'''
+
+SOLUTIONS_MAGIC = b"KPSOLS1"
+SOLUTIONS_HEADER = np.dtype([("magic", "S8"), ("n", "<u8"), ("count", "<u8"), ("reserved", "<u8")])
+
+# Bitsets are converted to words in chunks of this many packings
+CHUNK = 2**16
+
+
+def popcount(words):
+  '''
+  Number of set bits per uint64 word
+  '''
+  words = np.asarray(words, dtype = np.uint64)
+  if hasattr(np, "bitwise_count"):
+    return np.bitwise_count(words).astype(np.int64)
+  # NumPy < 2.0: count the bits of the bytes
+  table = np.array([bin(b).count("1") for b in range(256)], dtype = np.int64)
+  return table[np.ascontiguousarray(words).view(np.uint8)].reshape(words.shape + (8,)).sum(axis = -1)
+
+
+class SolutionSet:
+  '''
+  Packings of an instance stored as packed bitset rows in one contiguous array
+
+  Args:
+    n (int): Number of items of the instance.
+    reserve (int): Number of rows to allocate up front; the array grows
+    geometrically beyond it.
+
+  Attributes:
+    n: Number of items.
+    n_words: Number of uint64 words per packing.
+  '''
+  def __init__(self, n, reserve = 0):
+    self.n = n
+    self.n_words = max(1, -(-n // 64))
+    self._data = np.zeros((max(reserve, 1), self.n_words), dtype = np.uint64)
+    self._len = 0
+
+  @classmethod
+  def from_words(cls, n, words):
+    solutions = cls(n)
+    solutions._data = np.asarray(words, dtype = np.uint64).reshape(-1, solutions.n_words)
+    solutions._len = len(solutions._data)
+    return solutions
+
+  @classmethod
+  def from_packings(cls, n, packings):
+    '''
+    Solution set from lists of packed items (e.g. the result of optima_all())
+    '''
+    solutions = cls(n)
+    solutions.extend(packings)
+    return solutions
+
+  @classmethod
+  def from_matrix(cls, X):
+    '''
+    Solution set from a 0/1 matrix with one packing per row
+    '''
+    X = np.asarray(X)
+    return cls.from_words(X.shape[1], pack_bits(X))
+
+  def __len__(self):
+    return self._len
+
+  @property
+  def words(self):
+    # view of the used rows
+    return self._data[:self._len]
+
+  def _reserve(self, count):
+    if self._len + count > len(self._data):
+      data = np.zeros((max(2 * len(self._data), self._len + count), self.n_words), dtype = np.uint64)
+      data[:self._len] = self._data[:self._len]
+      self._data = data
+
+  def append_words(self, words):
+    words = np.asarray(words, dtype = np.uint64).reshape(-1, self.n_words)
+    self._reserve(len(words))
+    self._data[self._len:self._len + len(words)] = words
+    self._len += len(words)
+
+  def extend_bitsets(self, bitsets):
+    '''
+    Append packings given as Python int bitsets (bit i is item i), e.g.
+    iter_optima(bitset=True) of a DP solution
+    '''
+    bitsets = iter(bitsets)
+    while True:
+      chunk = list(itertools.islice(bitsets, CHUNK))
+      if not chunk:
+        return
+      self.append_words(bitsets_to_packed(chunk, self.n))
+
+  def extend(self, packings):
+    # packings as lists of packed items
+    self.extend_bitsets(sum(1 << item for item in packing) for packing in packings)
+
+  def __getitem__(self, r):
+    # packed items of row r in increasing order
+    r = range(self._len)[r]
+    return np.flatnonzero(unpack_bits(self.words[r:r + 1], self.n)[0]).tolist()
+
+  def __iter__(self):
+    for start in range(0, self._len, CHUNK):
+      for row in unpack_bits(self.words[start:start + CHUNK], self.n):
+        yield np.flatnonzero(row).tolist()
+
+  def to_matrix(self):
+    return unpack_bits(self.words, self.n)
+
+  def to_bitsets(self):
+    return [int.from_bytes(row.astype("<u8").tobytes(), "little") for row in self.words]
+
+  def evaluate(self, kpi):
+    '''
+    Weights and profits of all packings
+
+    Args:
+      kpi (KnapsackInstance): Instance with n items.
+    Returns:
+      Tuple (weights, profits) of int64 arrays with one entry per packing.
+    '''
+    assert kpi.N == self.n
+    if not isinstance(kpi, ArrayKnapsackInstance):
+      kpi = ArrayKnapsackInstance.from_instance(kpi)
+    return kpi.evaluate_many(self.words, kind = "packed")
+
+  def check(self, kpi, capacity = None, profit = None):
+    '''
+    Which packings are feasible (and have the given profit)?
+
+    Args:
+      kpi (KnapsackInstance): Instance with n items.
+      capacity (int): Knapsack capacity. Defaults to the capacity of kpi.
+      profit (int): If given, the profit each packing must have, e.g. the optimum.
+    Returns:
+      Boolean array with one entry per packing.
+    '''
+    if capacity is None:
+      capacity = kpi.capacity
+    weights, profits = self.evaluate(kpi)
+    ok = weights <= capacity
+    if profit is not None:
+      ok &= profits == profit
+    return ok
+
+  def item_frequencies(self):
+    '''
+    Number of packings each item is part of
+
+    Returns:
+      int64 array of length n.
+    '''
+    counts = np.zeros(self.n, dtype = np.int64)
+    for start in range(0, self._len, CHUNK):
+      counts += unpack_bits(self.words[start:start + CHUNK], self.n).sum(axis = 0, dtype = np.int64)
+    return counts
+
+  def sizes(self):
+    # number of packed items per packing
+    return popcount(self.words).sum(axis = 1)
+
+  def hamming_to(self, packing):
+    '''
+    Hamming distances of all packings to one packing
+
+    Args:
+      packing: Row number of the set or a list of packed items.
+    Returns:
+      int64 array with one entry per packing.
+    '''
+    if isinstance(packing, (int, np.integer)):
+      words = self.words[packing]
+    else:
+      words = bitsets_to_packed([sum(1 << item for item in packing)], self.n)[0]
+    return popcount(self.words ^ words).sum(axis = 1)
+
+  def hamming_matrix(self, rows = None):
+    '''
+    Pairwise Hamming distances
+
+    Args:
+      rows: Row selection. Defaults to all rows; the matrix has len(rows)^2 entries.
+    Returns:
+      Square int64 array.
+    '''
+    words = self.words if rows is None else self.words[rows]
+    D = np.zeros((len(words), len(words)), dtype = np.int64)
+    for k in range(self.n_words):
+      D += popcount(words[:, k][:, None] ^ words[:, k][None, :])
+    return D
+
+  def mean_hamming(self):
+    '''
+    Mean Hamming distance over all pairs of distinct rows
+
+    Computed from the item frequencies in O(count * n), i.e. without the
+    pairwise matrix: item i contributes f_i * (count - f_i) differing pairs.
+    '''
+    m = self._len
+    if m < 2:
+      return 0.0
+    f = self.item_frequencies().astype(np.float64)
+    return float((f * (m - f)).sum() / (m * (m - 1) / 2))
+
+  def save(self, filepath, overwrite = False):
+    '''
+    Save in the binary solution set format
+
+    Returns:
+      True if the file was written.
+    '''
+    if os.path.exists(filepath) and not overwrite:
+      print("File '{}' already exists!".format(filepath))
+      return False
+    header = np.array([(SOLUTIONS_MAGIC, self.n, self._len, 0)], dtype = SOLUTIONS_HEADER)
+    with open(filepath, "wb") as f:
+      f.write(header.tobytes())
+      f.write(np.ascontiguousarray(self.words, dtype = "<u8").tobytes())
+    return True
+
+  @classmethod
+  def load(cls, filepath, mmap = True):
+    '''
+    Load a solution set saved by save()
+
+    Args:
+      filepath (str): Path to the file.
+      mmap (bool): Memory-map the words (read-only)? Otherwise they are read
+      into memory. A mapped set is copied once packings are appended.
+    Returns:
+      SolutionSet
+    '''
+    header = np.fromfile(filepath, dtype = SOLUTIONS_HEADER, count = 1)
+    if len(header) == 0 or header["magic"][0] != SOLUTIONS_MAGIC:
+      raise ValueError("{} is not a solution set.".format(filepath))
+    n = int(header["n"][0])
+    count = int(header["count"][0])
+    n_words = max(1, -(-n // 64))
+    if mmap and count > 0:
+      words = np.memmap(filepath, dtype = "<u8", mode = "r", offset = SOLUTIONS_HEADER.itemsize, shape = (count, n_words))
+    else:
+      words = np.fromfile(filepath, dtype = "<u8", count = count * n_words, offset = SOLUTIONS_HEADER.itemsize).reshape(count, n_words)
+    solutions = cls(n)
+    solutions._data = words
+    solutions._len = count
+    return solutions
@@ -1,10 +1,11 @@
 from KP.knapsack import *
-from KP.algorithms.DP import DPWB
+from KP.algorithms.DP import DPWB_multi
+from KP.algorithms.cache import DPCache
+from KP.algorithms import instrument
+import contextlib
+from KP.experiments import runner, store
 import pprint
-import random
-import csv
 import itertools
-from joblib import Parallel, delayed # pip install joblib
 import multiprocessing
 
 '''
@@ -32,10 +33,62 @@ To this end, instead of nested loops, we should lazily iterate
 over a collection of tuples/lists (n, r, R, L, type, ...) and
 call a run_experiment function which also deals with output.
 '''
-if __name__ == "__main__":
-  # reproducibility
-  random.seed(1)
+# Lower bound for weight and profit sampling is fixed/constant
+Ls = 1
+
+# Seed of the sweep; each run draws its instance from a stream seeded by
+# (SEED, generator, R, n, run), i.e. results do not depend on the worker
+# process or the order in which runs are executed.
+SEED = 1
+GENERATORS = ["uncorr", "wcorr", "scorr", "ascorr", "invscorr", "ss", "usw"]
+
+# Cache of DP results shared by the worker processes; reruns of the grid
+# (e.g. after deleting the manifest) read the last DP rows from the cache
+# instead of running the DP again. Set to None to disable caching.
+CACHE = "data/cache"
+
+# DPCache of the worker process, created on its first run; a single instance
+# keeps the running size total of the cache across runs.
+_cache = None
+
+def getCache():
+  global _cache
+  if _cache is None and CACHE is not None:
+    _cache = DPCache(CACHE)
+  return _cache
+
+# If set, the DP calls of each run are recorded (table build time, cells
+# per second, peak table memory, ties) to this JSON lines file, tagged with
+# the parameters of the run; see KP.algorithms.instrument.load().
+PROFILE = None
+
+# Capacity factor
+H = 11
+h = list(range(1, H+1))
+
+# Names of fields in experimental setup
+# All capacity factors h are handled by a single DP run per instance,
+# i.e. the instance is shared by the H capacities of a run.
+expfields = ["generator", "R", "n", "run"]
+
+def runExperiment(expsetup):
+  expsetup = dict(zip(expfields, expsetup))
+  seed = [SEED, GENERATORS.index(expsetup["generator"]), expsetup["R"], expsetup["n"], expsetup["run"]]
+  kpi = generate_batch(1, n=expsetup["n"], L=Ls, R=expsetup["R"], type=expsetup["generator"], seed=seed)[0]
+  # set capacities
+  capacities = [(int)((hh/(H+1)) * kpi.wsum()) for hh in h]
+  cache = getCache()
+  profile = contextlib.nullcontext() if PROFILE is None else instrument.recording(instrument.JSONLinesSink(PROFILE), **expsetup)
+  with profile:
+    results = DPWB_multi(kpi, capacities, cache=cache)
+  return [[expsetup["generator"], Ls, expsetup["R"], expsetup["n"], hh, expsetup["run"], nsols] for hh, (_, nsols) in zip(h, results)]
+
+def experimentCost(expsetup):
+  # DP cost is n * W with W proportional to n * R
+  expsetup = dict(zip(expfields, expsetup))
+  return expsetup["n"] * expsetup["n"] * expsetup["R"]
 
+if __name__ == "__main__":
   # parallelization
   n_cpus = multiprocessing.cpu_count()
 
@@ -43,40 +96,30 @@ if __name__ == "__main__":
   ns = [k * 10 for k in range(5, 51, 5)]
 
   # Upper bound for weight and profit sampling
-  Ls = 1 # lower bound is fixed/constant
   Rs = [50, 100, 250]
 
-  # Capacity factor
-  H = 11
-  h = list(range(1, H+1))
-
   # generators
   generators = ["uncorr", "wcorr", "scorr", "ascorr", "invscorr", "ss"]
 
   # Number of runs
   runs = list(range(1, 26))
 
-  # Names of fields in experimental setup
-  expfields = ["generator", "R", "n", "run", "h"]
-
-  experiments = itertools.product(generators, Rs, ns, runs, h)
-
-  def runExperiment(expnumber, expsetup):
-    expsetup = dict(zip(expfields, expsetup))
-    outfilename = "data/output/raw/" + str(expnumber) + ".csv"
-    with open(outfilename, 'w', newline='') as outfile:
-      writer = csv.writer(outfile)
-      #writer.writerow(["generator", "L", "R", "n", "h", "run", "nsols"])
-      kpi = generate(n=expsetup["n"], L=Ls,  R=expsetup["R"], type=expsetup["generator"])
-      # set capacity
-      capacity = (int)((expsetup["h"]/(H+1)) * kpi.wsum())
-      nsols = DPWB(kpi, capacity=capacity).n_optima()
-      print(".", end="", flush=True)
-      row = [expsetup["generator"], Ls, expsetup["R"], expsetup["n"], expsetup["h"], expsetup["run"],nsols]
-      writer.writerow(row)
-
+  experiments = itertools.product(generators, Rs, ns, runs)
+
+  # Results are appended to a binary result store (see KP.experiments.store)
+  # and exported to CSV for ex03_analyse_nr_of_optima.r at the end.
+  # Finished runs (all h of a (generator, R, n, run) setup) are recorded in the
+  # manifest; an interrupted sweep continues where it stopped when restarted.
+  # Delete the manifest to start from scratch.
+  manifest = runner.Manifest("data/output/ex01_nr_of_optima.manifest")
+  columns = [("generator", "str16"), ("L", "int64"), ("R", "int64"), ("n", "int64"), ("h", "int64"), ("run", "int64"), ("nsols", "bigint"), ("time", "float64")]
+  outfile = store.ResultStore("data/output/ex01_nr_of_optima.kpr", columns, manifest=manifest)
+  if len(manifest) > 0:
+    print("Resuming; {0} runs are finished already.".format(len(manifest)))
   print("Starting experiments on {0} cores...\n".format(n_cpus))
-  Parallel(n_jobs=n_cpus)(delayed(runExperiment)(expnumber, expsetup) for expnumber, expsetup in enumerate(experiments))
+  runner.run(runExperiment, experiments, outfile, cost=experimentCost, n_jobs=n_cpus, manifest=manifest)
+  outfile.close()
+  store.to_csv("data/output/ex01_nr_of_optima.kpr", "data/output/ex01_nr_of_optima.csv")
 
 def source(filepath):
   exec(open(filepath).read())
@@ -5,6 +5,8 @@ library(RColorBrewer)
 
 # READ RAW OUTPUT FILES AND SAVE IN TABLE
 # ===
+# Only needed for old raw output; ex02 now writes the result store
+# data/output/ex01_nr_of_optima.kpr and exports it to data/output/ex01_nr_of_optima.csv.
 # outfiles = list.files("data/output/raw", pattern = "csv$", full.names = TRUE)
 # res = do.call(rbind, lapply(outfiles, function(of) {
 #   readr::read_delim(of,
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+
+from KP.experiments import runner, store, benchmark
+import contextlib
+import csv
+import io
+import os
+import tempfile
+import unittest
+
+def square(task):
+  return [[task, task * task]]
+
+def square_odd_fails(task):
+  if task % 2 == 1:
+    raise ValueError("odd task")
+  return square(task)
+
+class Flaky:
+  # fails on the first call of each task
+  def __init__(self):
+    self.seen = set()
+
+  def __call__(self, task):
+    if task not in self.seen:
+      self.seen.add(task)
+      raise RuntimeError("flaky")
+    return square(task)
+
+def read_rows(filepath):
+  with open(filepath) as f:
+    return list(csv.reader(f, delimiter = " "))
+
+class TestRunner(unittest.TestCase):
+  def test_chunks_longest_first(self):
+    chunks = runner.make_chunks(range(1, 11), cost = lambda task: task, chunk_cost = 12)
+    costs = [cost for cost, _ in chunks]
+    self.assertEqual(costs, sorted(costs, reverse = True))
+    self.assertEqual(sorted(task for _, chunk in chunks for task in chunk), list(range(1, 11)))
+    self.assertTrue(all(cost <= 12 or len(chunk) == 1 for cost, chunk in chunks))
+
+  def test_run_aggregates_results(self):
+    for n_jobs in [1, 2]:
+      with tempfile.TemporaryDirectory() as tmpdir:
+        filepath = os.path.join(tmpdir, "out.csv")
+        writer = runner.ResultWriter(filepath, ["task", "square", "time"])
+        runner.run(square, range(20), writer, cost = lambda task: task + 1, n_jobs = n_jobs, progress = False)
+        writer.close()
+        rows = read_rows(filepath)
+        self.assertEqual(rows[0], ["task", "square", "time"])
+        self.assertEqual(sorted((int(row[0]), int(row[1])) for row in rows[1:]), [(t, t * t) for t in range(20)])
+
+  def test_resume_skips_finished_tasks(self):
+    with tempfile.TemporaryDirectory() as tmpdir:
+      filepath = os.path.join(tmpdir, "out.csv")
+      manifest = runner.Manifest(os.path.join(tmpdir, "out.manifest"))
+      writer = runner.ResultWriter(filepath, ["task", "square", "time"], manifest = manifest)
+      with self.assertRaises(RuntimeError):
+        runner.run(square_odd_fails, range(10), writer, n_jobs = 1, chunk_cost = 1, progress = False, manifest = manifest, retries = 0)
+      writer.close()
+      # a chunk cut off by a crash: rows beyond the recorded size are dropped
+      with open(filepath, "a") as f:
+        f.write("99 98")
+
+      manifest = runner.Manifest(os.path.join(tmpdir, "out.manifest"))
+      self.assertEqual(len(manifest), 5)
+      self.assertTrue(manifest.done(4) and not manifest.done(5))
+      writer = runner.ResultWriter(filepath, ["task", "square", "time"], manifest = manifest)
+      n_run = runner.run(square, range(10), writer, n_jobs = 1, chunk_cost = 1, progress = False, manifest = manifest)
+      writer.close()
+      self.assertEqual(n_run, 5)
+      rows = read_rows(filepath)
+      self.assertEqual(rows[0], ["task", "square", "time"])
+      self.assertEqual(sorted((int(row[0]), int(row[1])) for row in rows[1:]), [(t, t * t) for t in range(10)])
+
+  def test_failed_chunks_are_retried(self):
+    with tempfile.TemporaryDirectory() as tmpdir:
+      filepath = os.path.join(tmpdir, "out.csv")
+      writer = runner.ResultWriter(filepath, ["task", "square", "time"])
+      output = io.StringIO()
+      with contextlib.redirect_stdout(output):
+        runner.run(Flaky(), range(6), writer, n_jobs = 1, progress = False, retries = 1)
+      writer.close()
+      self.assertEqual(output.getvalue(), "")
+      self.assertEqual(sorted(int(row[0]) for row in read_rows(filepath)[1:]), list(range(6)))
+
+class TestStore(unittest.TestCase):
+  columns = [("generator", "str16"), ("n", "int64"), ("run", "int64"), ("nsols", "bigint"), ("time", "float64")]
+
+  def rows(self):
+    return [[generator, n, run, 2**(n + run), 0.5] for generator in ["uncorr", "ss"] for n in [50, 100, 200] for run in range(1, 4)]
+
+  def test_roundtrip_and_filters(self):
+    with tempfile.TemporaryDirectory() as tmpdir:
+      filepath = os.path.join(tmpdir, "out.kpr")
+      writer = store.ResultStore(filepath, self.columns)
+      rows = self.rows()
+      writer.write(rows[:5])
+      writer.write(rows[5:])
+      writer.close()
+
+      data = store.load(filepath)
+      self.assertEqual([list(row) for row in zip(*(data[name].tolist() for name, _ in self.columns))], rows)
+      data = store.load(filepath, columns = ["run", "nsols"], generator = "ss", n = 100)
+      self.assertEqual(data["run"].tolist(), [1, 2, 3])
+      self.assertEqual(data["nsols"].tolist(), [2**101, 2**102, 2**103])
+      table = store.ResultTable(filepath)
+      self.assertEqual(len(table.select(n = [50, 200], run = 2)), 4)
+      self.assertEqual(len(table.select(generator = "wcorr")), 0)
+
+      store.to_csv(filepath, os.path.join(tmpdir, "out.csv"), columns = ["generator", "nsols"], n = 50, run = 1)
+      self.assertEqual(read_rows(os.path.join(tmpdir, "out.csv")), [["generator", "nsols"], ["uncorr", str(2**51)], ["ss", str(2**51)]])
+
+  def test_resume_with_runner(self):
+    with tempfile.TemporaryDirectory() as tmpdir:
+      filepath = os.path.join(tmpdir, "out.kpr")
+      manifest = runner.Manifest(os.path.join(tmpdir, "out.manifest"))
+      columns = [("task", "int64"), ("square", "bigint"), ("time", "float64")]
+      writer = store.ResultStore(filepath, columns, manifest = manifest)
+      with self.assertRaises(RuntimeError):
+        runner.run(square_odd_fails, range(10), writer, n_jobs = 1, chunk_cost = 1, progress = False, manifest = manifest, retries = 0)
+      writer.close()
+      manifest = runner.Manifest(os.path.join(tmpdir, "out.manifest"))
+      writer = store.ResultStore(filepath, columns, manifest = manifest)
+      self.assertEqual(runner.run(square, range(10), writer, n_jobs = 1, chunk_cost = 1, progress = False, manifest = manifest), 5)
+      writer.close()
+      data = store.load(filepath)
+      self.assertEqual(sorted(zip(data["task"].tolist(), data["square"].tolist())), [(t, t * t) for t in range(10)])
+
+class TestBenchmark(unittest.TestCase):
+  def test_run_and_compare(self):
+    report = benchmark.run(types = ["uncorr", "ss"], ns = [10], Rs = [20], hs = [6], tasks = ["DPWB/count", "DPWB/all"], repeat = 1)
+    self.assertEqual(len(report["results"]), 4)
+    with tempfile.TemporaryDirectory() as tmpdir:
+      filepath = os.path.join(tmpdir, "baseline.json")
+      benchmark.save(report, filepath)
+      baseline = benchmark.load(filepath)
+    self.assertFalse(any(row["regression"] for row in benchmark.compare(baseline, report)))
+
+    slower = {"meta": report["meta"], "results": [dict(result, seconds_min = result["seconds_min"] * 2 + 1) for result in report["results"]]}
+    rows = benchmark.compare(baseline, slower, threshold = 0.5)
+    self.assertTrue(all(row["regression"] for row in rows))
+    self.assertEqual(len(rows), 4)
+
+unittest.main()
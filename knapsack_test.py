@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+
+from KP.knapsack import KnapsackInstance, ArrayKnapsackInstance, generate, generate_batch, pack_bits, unpack_bits
+from KP.algorithms.DP import DPWB
+from KP.library import save_library, InstanceLibrary, convert, library_to_text
+from KP.solutions import SolutionSet
+import numpy as np
+import os
+import random
+import tempfile
+import unittest
+
+class TestKnapsack(unittest.TestCase):
+  def test_binary_instance_format(self):
+    random.seed(1)
+    kpi = generate(n = 50, R = 100, type = "uncorr")
+    kpi.capacity = 1000
+    with tempfile.TemporaryDirectory() as tmpdir:
+      filepath = os.path.join(tmpdir, "instance.kpb")
+      self.assertTrue(kpi.save_binary(filepath))
+      self.assertFalse(kpi.save_binary(filepath))
+      for mmap in [True, False]:
+        loaded = KnapsackInstance.load_binary(filepath, mmap = mmap)
+        self.assertEqual((loaded.capacity, list(loaded.weights), list(loaded.profits)), (kpi.capacity, kpi.weights, kpi.profits))
+
+      # large values are stored as int64
+      big = KnapsackInstance(None, [2**40, 1], [3, 2**35])
+      self.assertTrue(big.save_binary(filepath, overwrite = True))
+      loaded = KnapsackInstance.load_binary(filepath)
+      self.assertEqual((loaded.capacity, list(loaded.weights), list(loaded.profits)), (None, big.weights, big.profits))
+
+      # text <-> binary
+      textpath = os.path.join(tmpdir, "instance.csv")
+      kpi.save(textpath)
+      self.assertTrue(convert(textpath, filepath, overwrite = True))
+      self.assertTrue(convert(filepath, os.path.join(tmpdir, "copy.csv")))
+      with open(textpath) as f, open(os.path.join(tmpdir, "copy.csv")) as g:
+        self.assertEqual(f.read(), g.read())
+
+  def test_instance_library(self):
+    random.seed(1)
+    instances = [generate(n = n, R = 100, type = "scorr") for n in [1, 10, 20]]
+    instances[1].capacity = 123
+    with tempfile.TemporaryDirectory() as tmpdir:
+      filepath = os.path.join(tmpdir, "instances.kplib")
+      self.assertTrue(save_library(filepath, instances))
+      library = InstanceLibrary(filepath)
+      self.assertEqual(len(library), 3)
+      for kpi, loaded in zip(instances, library):
+        self.assertEqual((loaded.capacity, list(loaded.weights), list(loaded.profits)), (kpi.capacity, kpi.weights, kpi.profits))
+      # the output directory is created
+      written = library_to_text(filepath, os.path.join(tmpdir, "text", "instances"))
+      self.assertEqual(len(written), 3)
+      self.assertEqual(KnapsackInstance.load(written[1]).capacity, 123)
+
+  def test_array_instance(self):
+    random.seed(1)
+    kpi = generate(n = 70, R = 100, type = "wcorr")
+    kpi.capacity = int(kpi.wsum() / 2)
+    akpi = ArrayKnapsackInstance.from_instance(kpi)
+    x = [random.randint(0, 1) for _ in range(kpi.N)]
+    items = [i for i in range(kpi.N) if x[i] == 1]
+    self.assertEqual(akpi.evaluate(x), kpi.evaluate(x))
+    self.assertEqual((akpi.wsumint(items), akpi.psumint(items)), (kpi.wsumint(items), kpi.psumint(items)))
+    self.assertEqual(list(akpi.to_bitstring(items)), x)
+    self.assertEqual(akpi.lp_bound(), kpi.lp_bound())
+    self.assertEqual(DPWB(akpi).n_optima(), DPWB(kpi).n_optima())
+    with self.assertRaises(AttributeError):
+      akpi.foo = 1
+
+  def test_evaluate_many(self):
+    random.seed(1)
+    kpi = generate(n = 70, R = 100, type = "uncorr")
+    akpi = ArrayKnapsackInstance.from_instance(kpi)
+    X = (np.random.default_rng(1).random((50, kpi.N)) < 0.5).astype(np.uint8)
+    expected = [kpi.evaluate(list(x)) for x in X]
+    packed = pack_bits(X)
+    self.assertEqual(packed.shape, (50, 2))
+    self.assertTrue((unpack_bits(packed, kpi.N) == X).all())
+    representations = [X, packed, [sum(1 << int(i) for i in np.flatnonzero(x)) for x in X], [list(np.flatnonzero(x)) for x in X]]
+    for packings in representations:
+      W, P = akpi.evaluate_many(packings)
+      self.assertEqual(list(zip(W.tolist(), P.tolist())), expected)
+    # sums beyond float64 precision are exact
+    big = ArrayKnapsackInstance(None, [2**53 + 1] * 3, [2**60 + 1] * 3)
+    for packings in [np.ones((1, 3), dtype = np.uint8), [[0, 1, 2]]]:
+      W, P = big.evaluate_many(packings)
+      self.assertEqual((int(W[0]), int(P[0])), (3 * 2**53 + 3, 3 * 2**60 + 3))
+
+  def test_solution_set(self):
+    random.seed(1)
+    kpi = generate(n = 70, R = 100, type = "uncorr")
+    kpi.capacity = int(kpi.wsum() / 2)
+    X = (np.random.default_rng(1).random((40, kpi.N)) < 0.5).astype(np.uint8)
+    packings = [np.flatnonzero(x).tolist() for x in X]
+    solutions = SolutionSet.from_packings(kpi.N, packings[:10])
+    solutions.extend(packings[10:])
+    self.assertEqual(len(solutions), 40)
+    self.assertEqual(list(solutions), packings)
+    self.assertEqual((solutions[3], solutions[-1]), (packings[3], packings[-1]))
+    self.assertTrue((solutions.to_matrix() == X).all())
+    self.assertTrue((SolutionSet.from_matrix(X).words == solutions.words).all())
+
+    W, P = solutions.evaluate(kpi)
+    self.assertEqual(list(zip(W.tolist(), P.tolist())), [kpi.evaluate(list(x)) for x in X])
+    self.assertEqual(solutions.check(kpi).tolist(), [w <= kpi.capacity for w in W.tolist()])
+    self.assertEqual(solutions.item_frequencies().tolist(), X.sum(axis = 0).tolist())
+    self.assertEqual(solutions.sizes().tolist(), X.sum(axis = 1).tolist())
+    D = solutions.hamming_matrix()
+    self.assertEqual(D[2, 5], int((X[2] != X[5]).sum()))
+    self.assertEqual(solutions.hamming_to(2).tolist(), D[2].tolist())
+    self.assertEqual(solutions.hamming_to(packings[2]).tolist(), D[2].tolist())
+    self.assertAlmostEqual(solutions.mean_hamming(), D.sum() / (40 * 39))
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+      filepath = os.path.join(tmpdir, "solutions.kps")
+      self.assertTrue(solutions.save(filepath))
+      for mmap in [True, False]:
+        loaded = SolutionSet.load(filepath, mmap = mmap)
+        self.assertEqual(list(loaded), packings)
+      loaded.extend([[0, 69]])
+      self.assertEqual((len(loaded), loaded[-1]), (41, [0, 69]))
+
+  def test_generate_batch(self):
+    batch = generate_batch(20, n = 30, R = 250, type = "uncorr", seed = 1)
+    self.assertEqual((len(batch), batch.n), (20, 30))
+    # instance i only depends on the seed and i
+    self.assertTrue((generate_batch(5, n = 30, R = 250, type = "uncorr", seed = 1).weights == batch.weights[:5]).all())
+    self.assertFalse((generate_batch(5, n = 30, R = 250, type = "uncorr", seed = 2).weights == batch.weights[:5]).all())
+
+    for type in ["uncorr", "wcorr", "scorr", "ascorr", "invscorr", "ss", "usw"]:
+      batch = generate_batch(10, n = 50, R = 250, type = type, seed = 1)
+      ws, ps = batch.weights, batch.profits
+      if type == "usw":
+        self.assertTrue(ws.min() >= 100000 and ws.max() <= 100100 and ps.min() >= 1 and ps.max() <= 1000)
+      elif type == "invscorr":
+        self.assertTrue(ps.min() >= 1 and ps.max() <= 250 and (ws == ps + 25).all())
+      else:
+        self.assertTrue(ws.min() >= 1 and ws.max() <= 250)
+      if type == "wcorr":
+        self.assertTrue((ps >= 1).all() and (abs(ps - ws) <= 25).all())
+      if type == "scorr":
+        self.assertTrue((ps == ws + 25).all())
+      if type == "ascorr":
+        self.assertTrue((abs(ps - ws - 25) <= 0).all())
+      if type == "ss":
+        self.assertTrue((ps == ws).all())
+    self.assertEqual(list(batch[3].weights), list(batch.weights[3]))
+
+unittest.main()